@@ -0,0 +1,86 @@
+"""Benchmark the fused mode of the OTEPipeline against running each strategy as its own process.
+
+The pipeline consists of cheap mapping strategies only, which need no network access:
+
+.. code-block:: console
+
+    python benchmarks/fused_pipeline.py --strategies 20 --repeat 3
+
+For each mode, the wall time, the number of nodes and the size of the attributes of the
+session nodes created in the database are reported, followed by the time spent by the
+worker on loading the OTE strategy plugins.
+"""
+
+from __future__ import annotations
+
+import argparse
+from time import perf_counter
+
+from aiida import load_profile, orm
+from aiida.engine import run_get_node
+
+load_profile()
+
+from execflow.data.oteapi.session import SessionUpdateData  # noqa: E402
+from execflow.oteapi_strategies.registry import TIMINGS  # noqa: E402
+from execflow.workchains.oteapi_pipeline import OTEPipeline  # noqa: E402
+
+
+def get_pipeline(size: int) -> dict:
+    """Return a declarative pipeline of `size` mapping strategies."""
+    strategies = [
+        {
+            "mapping": f"map_{i}",
+            "mappingType": "triples",
+            "prefixes": {"map": "http://example.org/0.0.1/mapping_ontology#"},
+            "triples": [[f"http://onto-ns.com/meta/1.0/Foo#a{i}", "map:mapsTo", f"map:A{i}"]],
+        }
+        for i in range(size)
+    ]
+    return {
+        "version": 1,
+        "strategies": strategies,
+        "pipelines": {"pipe": " | ".join(strategy["mapping"] for strategy in strategies)},
+    }
+
+
+def count_nodes() -> tuple[int, int]:
+    """Return the number of nodes and the total size of the attributes of the session nodes."""
+    nodes = orm.QueryBuilder().append(orm.Node).count()
+    query = orm.QueryBuilder().append((orm.Dict, SessionUpdateData), project="attributes")
+    size = sum(len(str(attributes)) for (attributes,) in query.all())
+    return nodes, size
+
+
+def benchmark(pipeline: dict, fused: bool) -> tuple[float, int, int]:
+    nodes, size = count_nodes()
+    start = perf_counter()
+    _, node = run_get_node(OTEPipeline, pipeline=orm.Dict(pipeline), fused=orm.Bool(fused))
+    elapsed = perf_counter() - start
+    if not node.is_finished_ok:
+        raise RuntimeError(f"The pipeline failed: {node.exit_status} {node.exit_message}")
+    new_nodes, new_size = count_nodes()
+    return elapsed, new_nodes - nodes, new_size - size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--strategies", type=int, default=20, help="Number of strategies in the pipeline.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs of each mode.")
+    args = parser.parse_args()
+
+    pipeline = get_pipeline(args.strategies)
+    print(f"{'mode':<8} {'time (s)':>10} {'nodes':>8} {'session size':>14}")
+    for fused in (False, True):
+        results = [benchmark(pipeline, fused) for _ in range(args.repeat)]
+        elapsed = min(result[0] for result in results)
+        _, nodes, size = results[-1]
+        print(f"{'fused' if fused else 'default':<8} {elapsed:>10.2f} {nodes:>8} {size:>14}")
+
+    print("\nPlugin loading (s):")
+    for key, elapsed in TIMINGS.items():
+        print(f"  {key}: {elapsed:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
-"""Utility AiiDA calculation to update the session for 'function' and 'transformation'
-strategies."""
+"""Utility AiiDA calculations to update the session for 'function' and 'transformation'
+strategies, and to get the full session."""
 
 from __future__ import annotations
 
@@ -11,10 +11,21 @@ from aiida.plugins import DataFactory
 if TYPE_CHECKING:  # pragma: no cover
     from aiida.orm import Dict
 
+    from execflow.data.oteapi.session import SessionUpdateData
+
+
+@calcfunction
+def update_oteapi_session(session: Dict | SessionUpdateData, updates: Dict) -> SessionUpdateData:
+    """Return an updated session object.
+
+    The large values of `updates` are expected to be stored as blobs, see
+    :py:func:`execflow.data.oteapi.blobs.blob_dict`. The updated session refers to them
+    rather than storing them again.
+    """
+    return DataFactory("execflow.session_update")(updates.get_dict(), parent=session, offloaded=True)
+
 
 @calcfunction
-def update_oteapi_session(session: Dict, updates: Dict) -> Dict:
-    """Return an updated session object."""
-    updated_session = session.get_dict()
-    updated_session.update(updates.get_dict())
-    return DataFactory("core.dict")(updated_session)
+def materialize_oteapi_session(session: Dict | SessionUpdateData) -> Dict:
+    """Return the full session of a delta-encoded session object, with its large values resolved."""
+    return DataFactory("core.dict")(session.get_dict())
@@ -0,0 +1,197 @@
+"""OTE Transformation strategy running Python functions in a local process pool.
+
+CPU-bound transformations run in the worker processes of a `ProcessPoolExecutor`, shared
+by all transformations of an AiiDA worker, so that they use all cores of the node without
+any external service.
+
+The function is given by its import path, and must return a mapping of the entries to
+update in the session, e.g.:
+
+.. code-block:: yaml
+
+    strategies:
+      - transformation: fit
+        transformationType: local/processpool
+        configuration:
+          function: mypackage.fitting:fit
+          kwargs:
+            order: 3
+          session: true
+
+The transformations are only known to the AiiDA worker that ran them, and are lost when
+it stops. Their results are looked up by the transformation ID given in the session, so
+that any instance of the strategy in the worker can get them. The processes of the pool
+are spawned, which imports the main module again, so scripts running pipelines directly,
+rather than through the daemon, need an ``if __name__ == "__main__":`` guard.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from importlib import import_module
+import multiprocessing
+from typing import TYPE_CHECKING, Annotated, Any, Literal
+from uuid import uuid4
+
+from oteapi.models import AttrDict, TransformationConfig, TransformationStatus
+from pydantic import Field
+from pydantic.dataclasses import dataclass
+
+if TYPE_CHECKING:  # pragma: no cover
+    from concurrent.futures import Future
+
+MAX_WORKERS: int | None = None
+"""Number of processes of the pool, defaults to the number of CPUs."""
+
+# Worker-wide pool and running transformations: transformation ID -> future
+# Entries are removed once the result is read by `get`, or on cancellation
+EXECUTOR: ProcessPoolExecutor | None = None
+FUTURES: dict[str, Future] = {}
+FINISH_TIMES: dict[str, datetime] = {}
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Return the process pool of the worker, started on first use."""
+    global EXECUTOR  # noqa: PLW0603
+    if EXECUTOR is None:
+        # Not forked, the AiiDA worker holds threads and connections
+        EXECUTOR = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return EXECUTOR
+
+
+def now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def set_finish_time(task_id: str) -> None:
+    """Record the finish time of a transformation, unless it is not tracked anymore."""
+    if task_id in FUTURES:
+        FINISH_TIMES.setdefault(task_id, now())
+
+
+def call(function: str, args: list[Any], kwargs: dict[str, Any]) -> Any:
+    """Import a function from its `module:function` path and call it, in a process of the pool."""
+    module, name = function.split(":", 1)
+    return getattr(import_module(module), name)(*args, **kwargs)
+
+
+class LocalTransformationConfig(AttrDict):
+    """Configuration of a Python function run in the local process pool."""
+
+    function: Annotated[
+        str,
+        Field(description="Import path of the function, as `module:function`."),
+    ]
+    args: Annotated[
+        list[Any],
+        Field(default_factory=list, description="Positional arguments of the function."),
+    ]
+    kwargs: Annotated[
+        dict[str, Any],
+        Field(default_factory=dict, description="Keyword arguments of the function."),
+    ]
+    session: Annotated[
+        bool,
+        Field(description="Whether to pass the OTE session as the `session` keyword argument."),
+    ] = False
+
+
+class LocalTransformationStrategyConfig(TransformationConfig):
+    """Local process pool transformation strategy config."""
+
+    transformationType: Annotated[
+        Literal["local/processpool"],
+        Field(description=TransformationConfig.model_fields["transformationType"].description),
+    ] = "local/processpool"
+    configuration: Annotated[
+        LocalTransformationConfig,
+        Field(description="Local process pool transformation strategy-specific configuration."),
+    ]
+
+
+@dataclass
+class LocalTransformationStrategy:
+    """Run a Python function in the local process pool.
+
+    **Registers strategies**:
+
+    - `("transformationType", "local/processpool")`
+
+    """
+
+    transformation_config: LocalTransformationStrategyConfig
+    task_id: str | None = None
+
+    def initialize(self, session: dict[str, Any] | None = None) -> AttrDict:  # noqa: ARG002
+        """Initialize strategy."""
+        return AttrDict()
+
+    def run(self, session: dict[str, Any] | None = None) -> TransformationStatus:
+        """Submit the function to the process pool."""
+        config = self.transformation_config.configuration
+        kwargs = dict(config.kwargs)
+        if config.session:
+            kwargs["session"] = dict(session or {})
+
+        task_id = self.task_id = str(uuid4())
+        future = get_executor().submit(call, config.function, list(config.args), kwargs)
+        FUTURES[task_id] = future
+        future.add_done_callback(lambda _: set_finish_time(task_id))
+        return self.status(task_id)
+
+    def status(self, task_id: str) -> TransformationStatus:
+        """Return the status of a transformation, using the Celery state names."""
+        future = FUTURES.get(task_id)
+        if future is None:
+            # Cancelled, or run by another worker
+            return TransformationStatus(
+                id=task_id,
+                status="REVOKED",
+                messages=["Unknown transformation, it may have been run by another worker or cancelled."],
+                finishTime=FINISH_TIMES.get(task_id, now()),
+            )
+        if not future.done():
+            return TransformationStatus(id=task_id, status="STARTED" if future.running() else "PENDING")
+
+        finish_time = FINISH_TIMES.setdefault(task_id, now())
+        if future.cancelled():
+            # There is no result to get
+            FUTURES.pop(task_id, None)
+            FINISH_TIMES.pop(task_id, None)
+            return TransformationStatus(id=task_id, status="REVOKED", finishTime=finish_time)
+        if future.exception() is not None:
+            return TransformationStatus(
+                id=task_id, status="FAILURE", messages=[repr(future.exception())], finishTime=finish_time
+            )
+        return TransformationStatus(id=task_id, status="SUCCESS", finishTime=finish_time)
+
+    def cancel(self, task_id: str) -> None:
+        """Cancel a transformation, unless it has already started, and stop tracking it."""
+        future = FUTURES.pop(task_id, None)
+        FINISH_TIMES.pop(task_id, None)
+        if future is not None:
+            future.cancel()
+
+    def get(self, session: dict[str, Any] | None = None) -> AttrDict:
+        """Return the session updates returned by the function.
+
+        The transformation is the one whose ID is given in the session, see
+        :py:data:`execflow.oteapi_strategies.transformation.TRANSFORMATION_ID_KEY`, or
+        else the last one run by this instance.
+
+        Raises:
+            RuntimeError: If the transformation is unknown or was cancelled.
+
+        """
+        from execflow.oteapi_strategies.transformation import TRANSFORMATION_ID_KEY
+
+        task_id = (session or {}).get(TRANSFORMATION_ID_KEY, self.task_id)
+        if task_id is None or task_id not in FUTURES:
+            raise RuntimeError(
+                f"Unknown transformation {task_id}, it may have been run by another worker or cancelled."
+            )
+
+        future = FUTURES.pop(task_id)
+        FINISH_TIMES.pop(task_id, None)
+        return AttrDict(**future.result())
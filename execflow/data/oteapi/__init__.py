@@ -7,6 +7,7 @@ from .filterconfig import FilterConfigData
 from .functionconfig import FunctionConfigData
 from .mappingconfig import MappingConfigData
 from .resourceconfig import ResourceConfigData
+from .session import SessionUpdateData
 from .transformationconfig import TransformationConfigData, TransformationStatusData
 
 __all__ = (
@@ -15,6 +16,7 @@ __all__ = (
     "MappingConfigData",
     "OTEPipelineData",
     "ResourceConfigData",
+    "SessionUpdateData",
     "TransformationConfigData",
     "TransformationStatusData",
 )
@@ -0,0 +1,104 @@
+"""Out-of-band storage of large OTE session values.
+
+Strategies may put large payloads, e.g. parsed file contents or arrays, in the OTE
+session. Instead of storing them in the attributes of the session nodes, which are
+written to the database, the values whose JSON serialization is larger than
+`BLOB_THRESHOLD` bytes are stored in the repository of the node, and replaced by a
+reference to them in its attributes.
+
+Blobs are named after the SHA-256 of their content. Since the AiiDA repository is
+itself content-addressed, a payload that is stored by several nodes is only stored
+once on disk. A reference also holds the UUID of the node storing the blob, so that
+other nodes can refer to it rather than storing it again.
+"""
+
+from __future__ import annotations
+
+from hashlib import sha256
+import json
+from typing import TYPE_CHECKING
+
+from aiida.orm import Dict, load_node
+
+if TYPE_CHECKING:  # pragma: no cover
+    from typing import Any
+
+    from aiida.orm import Node
+
+BLOB_THRESHOLD = 64 * 1024
+"""Size in bytes of the JSON serialization of a value above which it is stored as a blob."""
+
+BLOB_KEY = "__execflow_blob__"
+"""Key of the references to blobs in the attributes."""
+
+BLOB_DIR = "blobs"
+"""Directory of the blobs in the repository of a node."""
+
+
+def is_blob_reference(value: Any) -> bool:
+    """Return whether a value is a reference to a blob."""
+    return (
+        isinstance(value, dict)
+        and value.keys() == {BLOB_KEY}
+        and isinstance(value[BLOB_KEY], dict)
+        and value[BLOB_KEY].keys() == {"sha256", "node"}
+    )
+
+
+def offload(node: Node, values: dict[str, Any]) -> dict[str, Any]:
+    """Store the large values in the repository of an unstored node.
+
+    Values that look like a reference to a blob are stored as blobs whatever their size,
+    so that they are not mistaken for one when resolved.
+
+    Parameters:
+        node: The unstored node to store the blobs in.
+        values: The values to store.
+
+    Returns:
+        The values, where the large ones are replaced by a reference to their blob.
+
+    """
+    offloaded = {}
+    for key, value in values.items():
+        try:
+            content = json.dumps(value).encode()
+        except TypeError:
+            # Not JSON serializable, left to AiiDA to clean or reject
+            offloaded[key] = value
+            continue
+
+        if len(content) <= BLOB_THRESHOLD and not is_blob_reference(value):
+            offloaded[key] = value
+            continue
+
+        digest = sha256(content).hexdigest()
+        node.base.repository.put_object_from_bytes(content, f"{BLOB_DIR}/{digest}.json")
+        offloaded[key] = {BLOB_KEY: {"sha256": digest, "node": node.uuid}}
+    return offloaded
+
+
+def resolve(node: Node, values: dict[str, Any]) -> dict[str, Any]:
+    """Return the values of a node, where the references to blobs are replaced by their value."""
+    return {key: load_blob(node, value) if is_blob_reference(value) else value for key, value in values.items()}
+
+
+def load_blob(node: Node, reference: dict[str, Any]) -> Any:
+    """Return the value of a blob referred to by a node.
+
+    The blob is read from the repository of the node, or of the node it refers to.
+    """
+    blob = reference[BLOB_KEY]
+    if blob["node"] != node.uuid:
+        node = load_node(blob["node"])
+    return json.loads(node.base.repository.get_object_content(f"{BLOB_DIR}/{blob['sha256']}.json", mode="rb"))
+
+
+def blob_dict(values: dict[str, Any]) -> Dict:
+    """Return a `Dict` of values, where the large ones are stored as blobs.
+
+    Its values are resolved with `resolve(node, node.get_dict())`.
+    """
+    node = Dict()
+    node.set_dict(offload(node, values))
+    return node
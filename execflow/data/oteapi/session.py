@@ -0,0 +1,135 @@
+"""Delta-encoded OTE session AiiDA Data Node class.
+
+Every OTE strategy only adds a few entries to the session. Instead of storing the full
+session after each strategy, the session of a pipeline is stored as a base
+:py:class:`aiida.orm.Dict` followed by a chain of `SessionUpdateData` nodes, each holding
+the entries updated by one strategy and a reference to the previous session node.
+
+Large values are stored out-of-band in the repository of the update nodes, see
+:py:mod:`execflow.data.oteapi.blobs`, so that the session nodes stay small.
+
+The full session is reconstructed when it is needed, e.g. by `get_dict()`. The
+reconstructed sessions of the most recently used stored nodes are cached per worker,
+so that reconstructing the session after a strategy only applies its own update, and
+reading a single entry reads it from the cached session.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from copy import deepcopy
+from typing import TYPE_CHECKING
+
+from aiida.orm import load_node
+
+from execflow.data.oteapi.base import ExtendedData
+from execflow.data.oteapi.blobs import offload, resolve
+
+if TYPE_CHECKING:  # pragma: no cover
+    from collections.abc import ItemsView, KeysView
+    from typing import Any
+
+    from aiida.orm import Dict
+
+SESSION_CACHE_SIZE = 32
+"""Number of reconstructed sessions cached per worker."""
+
+# Worker-wide cache of the reconstructed sessions: node UUID -> session
+SESSIONS: OrderedDict[str, dict[str, Any]] = OrderedDict()
+
+
+class SessionUpdateData(ExtendedData):
+    """Update of an OTE session by a strategy.
+
+    Args:
+        updates (dict): The entries of the session updated by the strategy. Large values
+            are stored as blobs in the repository of the node.
+        parent (Union[Dict, SessionUpdateData]): The stored session node that was
+            updated.
+        offloaded (bool): Whether the large values of `updates` are already references
+            to blobs, e.g. the values of a `Dict` created by
+            :py:func:`execflow.data.oteapi.blobs.blob_dict`. The references are then kept
+            as they are, rather than storing the blobs again.
+
+    """
+
+    def __init__(
+        self,
+        updates: dict[str, Any],
+        parent: Dict | SessionUpdateData,
+        offloaded: bool = False,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(**kwargs)
+
+        if not parent.is_stored:
+            raise ValueError("The parent session node must be stored.")
+
+        attr_dict = {"updates": updates if offloaded else offload(self, updates), "parent": parent.uuid}
+
+        self.base.attributes.set_many(attr_dict)
+
+    @property
+    def updates(self) -> dict[str, Any]:
+        """The entries of the session updated by the strategy."""
+        return resolve(self, self.base.attributes.get("updates"))
+
+    @property
+    def parent(self) -> str:
+        """The UUID of the session node that was updated."""
+        return self.base.attributes.get("parent")
+
+    def get_dict(self) -> dict[str, Any]:
+        """Return the full session as a Python dictionary."""
+        return get_session(self)
+
+    def keys(self) -> KeysView[str]:
+        return load_session(self).keys()
+
+    def items(self) -> ItemsView[str, Any]:
+        return load_session(self).items()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return load_session(self).get(key, default)
+
+    def __getitem__(self, key: str) -> Any:
+        return load_session(self)[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in load_session(self)
+
+
+def get_session(node: Dict | SessionUpdateData) -> dict[str, Any]:
+    """Return a copy of the full session of a session node, which can be modified."""
+    return deepcopy(load_session(node))
+
+
+def load_session(node: Dict | SessionUpdateData) -> dict[str, Any]:
+    """Return the full session of a session node.
+
+    The chain of updates is followed back to the base session or to the closest cached
+    session, and the updates are applied on top of it. The session may be the cached
+    one, and must not be modified.
+    """
+    chain = []
+    current = node
+    while isinstance(current, SessionUpdateData) and current.uuid not in SESSIONS:
+        chain.append(current)
+        current = load_node(current.parent)
+
+    if isinstance(current, SessionUpdateData):
+        SESSIONS.move_to_end(current.uuid)
+        # Updates replace whole entries, the values are shared with the cached session
+        session = dict(SESSIONS[current.uuid]) if chain else SESSIONS[current.uuid]
+    else:
+        session = current.get_dict()
+
+    for update in reversed(chain):
+        session.update(update.updates)
+
+    if chain and node.is_stored:
+        SESSIONS[node.uuid] = session
+        while len(SESSIONS) > SESSION_CACHE_SIZE:
+            SESSIONS.popitem(last=False)
+
+    return session
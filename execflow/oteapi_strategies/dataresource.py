@@ -10,61 +10,67 @@ from typing import TYPE_CHECKING
 
 from aiida.engine import calcfunction
 from aiida.plugins import DataFactory
-from oteapi.plugins import create_strategy, load_strategies
+
+from execflow.oteapi_strategies.registry import get_strategy
 
 if TYPE_CHECKING:  # pragma: no cover
+    from typing import Any
+
     from aiida.orm import Dict
 
     from execflow.data.oteapi.resourceconfig import ResourceConfigData
+    from execflow.data.oteapi.session import SessionUpdateData
 
 
-@calcfunction
-def init_dataresource(config: ResourceConfigData, session: Dict) -> Dict:
-    """Initialize an OTE Data Resource strategy."""
-    load_strategies(False)
-
+def initialize(config: ResourceConfigData, session: dict[str, Any]) -> dict[str, Any]:
+    """Return the session update of initializing an OTE Data Resource strategy."""
     if config.downloadUrl and config.mediaType:
         # Download strategy
-        session_update = create_strategy("download", config.get_dict()).initialize(session.get_dict())
+        session_update = get_strategy("download", config.get_dict()).initialize(session)
 
         # Parse strategy
-        parse_session = session.get_dict()
+        parse_session = dict(session)
         parse_session.update(session_update)
-        session_update = create_strategy("parse", config.get_dict()).initialize(session.get_dict())
+        session_update = get_strategy("parse", config.get_dict()).initialize(session)
     elif config.accessUrl and config.accessService:
         # Resource strategy
-        session_update = create_strategy("resource", config.get_dict()).initialize(session.get_dict())
+        session_update = get_strategy("resource", config.get_dict()).initialize(session)
     else:
         raise ValueError(
             "Either of the pairs downloadUrl/mediaType and accessUrl/accessService must be defined in the config."
         )
 
-    updated_session = session.get_dict()
-    updated_session.update(session_update)
-    return DataFactory("core.dict")(updated_session)
-
+    return session_update
 
-@calcfunction
-def get_dataresource(config: ResourceConfigData, session: Dict) -> Dict:
-    """Get/Execute an OTE Data Resource strategy."""
-    load_strategies(False)
 
+def get(config: ResourceConfigData, session: dict[str, Any]) -> dict[str, Any]:
+    """Return the session update of getting/executing an OTE Data Resource strategy."""
     if config.downloadUrl and config.mediaType:
         # Download strategy
-        session_update = create_strategy("download", config.get_dict()).get(session.get_dict())
+        session_update = get_strategy("download", config.get_dict()).get(session)
 
         # Parse strategy
-        parse_session = session.get_dict()
+        parse_session = dict(session)
         parse_session.update(session_update)
-        session_update = create_strategy("parse", config.get_dict()).get(parse_session)
+        session_update = get_strategy("parse", config.get_dict()).get(parse_session)
     elif config.accessUrl and config.accessService:
         # Resource strategy
-        session_update = create_strategy("resource", config.get_dict()).get(session.get_dict())
+        session_update = get_strategy("resource", config.get_dict()).get(session)
     else:
         raise ValueError(
             "Either of the pairs downloadUrl/mediaType and accessUrl/accessService must be defined in the config."
         )
 
-    updated_session = session.get_dict()
-    updated_session.update(session_update)
-    return DataFactory("core.dict")(updated_session)
+    return session_update
+
+
+@calcfunction
+def init_dataresource(config: ResourceConfigData, session: Dict | SessionUpdateData) -> SessionUpdateData:
+    """Initialize an OTE Data Resource strategy."""
+    return DataFactory("execflow.session_update")(initialize(config, session.get_dict()), parent=session)
+
+
+@calcfunction
+def get_dataresource(config: ResourceConfigData, session: Dict | SessionUpdateData) -> SessionUpdateData:
+    """Get/Execute an OTE Data Resource strategy."""
+    return DataFactory("execflow.session_update")(get(config, session.get_dict()), parent=session)
@@ -9,39 +9,50 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 
 from aiida.engine import workfunction
-from aiida.plugins import CalculationFactory, DataFactory
-from oteapi.plugins import create_strategy, load_strategies
+from aiida.plugins import CalculationFactory
+
+from execflow.data.oteapi.blobs import blob_dict
+from execflow.oteapi_strategies.registry import get_strategy
 
 if TYPE_CHECKING:  # pragma: no cover
+    from typing import Any
+
     from aiida.orm import Dict
     from oteapi.interfaces import IFunctionStrategy
 
     from execflow.data.oteapi.functionconfig import FunctionConfigData
+    from execflow.data.oteapi.session import SessionUpdateData
+
+
+def initialize(config: FunctionConfigData, session: dict[str, Any]) -> dict[str, Any]:
+    """Return the session update of initializing an OTE Function strategy."""
+    strategy: IFunctionStrategy = get_strategy("function", config.get_dict())
+    return strategy.initialize(session)
+
+
+def get(config: FunctionConfigData, session: dict[str, Any]) -> dict[str, Any]:
+    """Return the session update of getting/executing an OTE Function strategy."""
+    strategy: IFunctionStrategy = get_strategy("function", config.get_dict())
+    return strategy.get(session)
 
 
 @workfunction
-def init_function(config: FunctionConfigData, session: Dict) -> Dict:
+def init_function(config: FunctionConfigData, session: Dict | SessionUpdateData) -> SessionUpdateData:
     """Initialize an OTE Function strategy."""
-    load_strategies(False)
-
-    strategy: IFunctionStrategy = create_strategy("function", config.get_dict())
-    updates_for_session = strategy.initialize(session.get_dict())
+    updates_for_session = initialize(config, session.get_dict())
 
     return CalculationFactory("execflow.update_oteapi_session")(
         session=session,
-        updates=DataFactory("core.dict")(updates_for_session),
+        updates=blob_dict(updates_for_session),
     )
 
 
 @workfunction
-def get_function(config: FunctionConfigData, session: Dict) -> Dict:
+def get_function(config: FunctionConfigData, session: Dict | SessionUpdateData) -> SessionUpdateData:
     """Get/Execute an OTE Function strategy."""
-    load_strategies(False)
-
-    strategy: IFunctionStrategy = create_strategy("function", config.get_dict())
-    updates_for_session = strategy.get(session.get_dict())
+    updates_for_session = get(config, session.get_dict())
 
     return CalculationFactory("execflow.update_oteapi_session")(
         session=session,
-        updates=DataFactory("core.dict")(updates_for_session),
+        updates=blob_dict(updates_for_session),
     )
@@ -0,0 +1,85 @@
+"""AiiDA Process running a whole sequence of OTE strategies.
+
+Running every `init`/`get` of a pipeline as its own AiiDA Process stores a full session
+for each of them. For pipelines of cheap strategies, this provenance overhead dwarfs the
+actual work, so the fused pipeline runs the whole sequence in a single process and only
+stores the final session.
+
+Since some OTE strategies may subsequently invoke other AiiDA Workflows or
+Calculations, it is semantically equivalent to an AiiDA Workflow.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from aiida.engine import workfunction
+from aiida.plugins import CalculationFactory
+
+from execflow.data.oteapi.blobs import blob_dict
+from execflow.oteapi_strategies import dataresource, function, mapping, transformation
+from execflow.oteapi_strategies import filter as filter_strategy
+
+if TYPE_CHECKING:  # pragma: no cover
+    from aiida.orm import Dict, Float, List
+
+    from execflow.data.oteapi.genericconfig import GenericConfigData
+    from execflow.data.oteapi.session import SessionUpdateData
+
+STRATEGY_MODULES = {
+    "dataresource": dataresource,
+    "filter": filter_strategy,
+    "function": function,
+    "mapping": mapping,
+    "transformation": transformation,
+}
+
+
+@workfunction
+def run_fused_pipeline(
+    strategies: List,
+    session: Dict | SessionUpdateData,
+    walltime: Float | None = None,
+    interval: Float | None = None,
+    max_interval: Float | None = None,
+    **configs: GenericConfigData,
+) -> SessionUpdateData:
+    """Run a sequence of OTE strategies in a single process.
+
+    Parameters:
+        strategies: The `(method, strategy type, config key)` of the strategies to run,
+            in order. The method is either `init` or `get`.
+        session: The OTE session to start from.
+        walltime: The walltime of the transformations, see
+            :py:func:`execflow.oteapi_strategies.transformation.get`.
+        interval: The time before the first check of the status of the transformations.
+        max_interval: The maximum time between two checks of the status of the
+            transformations.
+        configs: The configurations of the strategies.
+
+    Returns:
+        The OTE session after running all strategies.
+
+    """
+    polling = {
+        name: value.value
+        for name, value in (("walltime", walltime), ("interval", interval), ("max_interval", max_interval))
+        if value is not None
+    }
+
+    current_session = session.get_dict()
+    updates_for_session = {}
+    for method, strategy_type, key in strategies.get_list():
+        module = STRATEGY_MODULES[strategy_type]
+        if (method, strategy_type) == ("get", "transformation"):
+            session_update = module.get(configs[key], current_session, **polling)
+        else:
+            run_strategy = module.initialize if method == "init" else module.get
+            session_update = run_strategy(configs[key], current_session)
+        current_session.update(session_update)
+        updates_for_session.update(session_update)
+
+    return CalculationFactory("execflow.update_oteapi_session")(
+        session=session,
+        updates=blob_dict(updates_for_session),
+    )
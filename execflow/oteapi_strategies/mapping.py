@@ -10,32 +10,38 @@ from typing import TYPE_CHECKING
 
 from aiida.engine import calcfunction
 from aiida.plugins import DataFactory
-from oteapi.plugins import create_strategy, load_strategies
+
+from execflow.oteapi_strategies.registry import get_strategy
 
 if TYPE_CHECKING:  # pragma: no cover
+    from typing import Any
+
     from aiida.orm import Dict
     from oteapi.interfaces import IMappingStrategy
 
     from execflow.data.oteapi.mappingconfig import MappingConfigData
+    from execflow.data.oteapi.session import SessionUpdateData
+
+
+def initialize(config: MappingConfigData, session: dict[str, Any]) -> dict[str, Any]:
+    """Return the session update of initializing an OTE Mapping strategy."""
+    strategy: IMappingStrategy = get_strategy("mapping", config.get_dict())
+    return strategy.initialize(session)
+
+
+def get(config: MappingConfigData, session: dict[str, Any]) -> dict[str, Any]:
+    """Return the session update of getting/executing an OTE Mapping strategy."""
+    strategy: IMappingStrategy = get_strategy("mapping", config.get_dict())
+    return strategy.get(session)
 
 
 @calcfunction
-def init_mapping(config: MappingConfigData, session: Dict) -> Dict:
+def init_mapping(config: MappingConfigData, session: Dict | SessionUpdateData) -> SessionUpdateData:
     """Initialize an OTE Mapping strategy."""
-    load_strategies(False)
-
-    strategy: IMappingStrategy = create_strategy("mapping", config.get_dict())
-    updated_session = session.get_dict()
-    updated_session.update(strategy.initialize(updated_session))
-    return DataFactory("core.dict")(updated_session)
+    return DataFactory("execflow.session_update")(initialize(config, session.get_dict()), parent=session)
 
 
 @calcfunction
-def get_mapping(config: MappingConfigData, session: Dict) -> Dict:
+def get_mapping(config: MappingConfigData, session: Dict | SessionUpdateData) -> SessionUpdateData:
     """Get/Execute an OTE Mapping strategy."""
-    load_strategies(False)
-
-    strategy: IMappingStrategy = create_strategy("mapping", config.get_dict())
-    updated_session = session.get_dict()
-    updated_session.update(strategy.get(updated_session))
-    return DataFactory("core.dict")(updated_session)
+    return DataFactory("execflow.session_update")(get(config, session.get_dict()), parent=session)
@@ -0,0 +1,134 @@
+"""Worker-wide registry of the OTE strategy plugins.
+
+Scanning the entry points of the OTE strategies is done once per worker, when the first
+strategy is created, rather than by every strategy process. The implementations of the
+strategies are only imported when they are first used.
+
+The registry does not notice plugins installed after it was loaded, call
+`refresh_registry()` to scan the entry points again.
+
+Within a running `OTEPipeline`, the `init` and `get` of a strategy share the same
+strategy instance, and so its connections and clients, through `get_strategy()`. The
+instances are pooled per pipeline run and closed when the pipeline terminates.
+
+The time spent on plugin discovery and imports is recorded in `TIMINGS`, e.g.:
+
+.. code-block:: python
+
+    from execflow.oteapi_strategies.registry import TIMINGS
+
+    print(TIMINGS)
+    # {'entry_points': 0.041, 'mapping:oteapi.strategies.mapping.mapping.MappingStrategy': 0.003}
+"""
+
+from __future__ import annotations
+
+from hashlib import sha256
+import json
+import logging
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+from aiida.engine import Process
+from oteapi.plugins import create_strategy as create_oteapi_strategy
+from oteapi.plugins import load_strategies
+
+if TYPE_CHECKING:  # pragma: no cover
+    from typing import Any
+
+    from oteapi.interfaces import IStrategy
+
+LOGGER = logging.getLogger(__name__)
+
+# Time in seconds spent loading the entry points, under "entry_points", and creating the
+# first strategy of each implementation, including its import, under "type:class"
+TIMINGS: dict[str, float] = {}
+
+# Strategy instances of the running pipelines: pipeline UUID -> strategy key -> strategy
+POOLS: dict[str, dict[str, IStrategy]] = {}
+
+
+def load_registry() -> None:
+    """Load the entry points of the OTE strategies, unless already done by this worker."""
+    if "entry_points" not in TIMINGS:
+        refresh_registry()
+
+
+def refresh_registry() -> None:
+    """Scan the entry points of the OTE strategies again, e.g. after installing a plugin."""
+    TIMINGS.clear()
+    start = perf_counter()
+    load_strategies(False)
+    TIMINGS["entry_points"] = perf_counter() - start
+
+
+def create_strategy(strategy_type: str, config: dict[str, Any]) -> IStrategy:
+    """Return a new OTE strategy from the registry.
+
+    Parameters:
+        strategy_type: The type of the strategy, e.g. `"mapping"` or `"download"`.
+        config: The configuration of the strategy.
+
+    Returns:
+        The strategy implementation instantiated with the configuration.
+
+    """
+    load_registry()
+
+    start = perf_counter()
+    strategy = create_oteapi_strategy(strategy_type, config)
+    implementation = type(strategy)
+    TIMINGS.setdefault(
+        f"{strategy_type}:{implementation.__module__}.{implementation.__qualname__}", perf_counter() - start
+    )
+    return strategy
+
+
+def open_pool(uuid: str) -> None:
+    """Pool the strategies created by the processes called by a process, until `close_pool()`."""
+    POOLS.setdefault(uuid, {})
+
+
+def close_pool(uuid: str) -> None:
+    """Close the strategies pooled for a process, calling their `close()` method if any."""
+    for key, strategy in POOLS.pop(uuid, {}).items():
+        close = getattr(strategy, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception:
+                LOGGER.exception("Failed to close the strategy %s", key)
+
+
+def get_pool() -> dict[str, IStrategy] | None:
+    """Return the pool of the closest caller of the current process that has one, if any."""
+    process = Process.current()
+    node = process.node if process is not None else None
+    while node is not None:
+        if node.uuid in POOLS:
+            return POOLS[node.uuid]
+        node = node.caller
+    return None
+
+
+def get_strategy(strategy_type: str, config: dict[str, Any]) -> IStrategy:
+    """Return the OTE strategy of a configuration from the pool of the running pipeline.
+
+    The strategy is created on first use, or for every call outside a pipeline with a pool.
+
+    Parameters:
+        strategy_type: The type of the strategy, e.g. `"mapping"` or `"download"`.
+        config: The configuration of the strategy.
+
+    Returns:
+        The strategy implementation instantiated with the configuration.
+
+    """
+    pool = get_pool()
+    if pool is None:
+        return create_strategy(strategy_type, config)
+
+    key = f"{strategy_type}:{sha256(json.dumps(config, sort_keys=True, default=str).encode()).hexdigest()}"
+    if key not in pool:
+        pool[key] = create_strategy(strategy_type, config)
+    return pool[key]
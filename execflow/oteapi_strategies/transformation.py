@@ -2,6 +2,11 @@
 
 Since OTE Transformation strategies may subsequently invoke other AiiDA Workflows or
 Calculations, it is semantically equivalent to an AiiDA Workflow.
+
+Transformations may run for a long time. Within an `OTEPipeline`, their `get` is run by
+the `GetTransformation` process, which waits between the checks of the status of the
+transformation without blocking the worker, so that a single worker can supervise many
+running transformations.
 """
 
 from __future__ import annotations
@@ -9,76 +14,258 @@ from __future__ import annotations
 from time import sleep, time
 from typing import TYPE_CHECKING
 
-from aiida.engine import workfunction
-from aiida.plugins import CalculationFactory, DataFactory
-from oteapi.plugins import create_strategy, load_strategies
+from aiida.engine import Process, run, workfunction
+from aiida.orm import Dict, Float, WorkflowNode
+from aiida.plugins import CalculationFactory
+from plumpy.persistence import auto_persist
+from plumpy.process_states import ProcessState, Wait
+
+from execflow.data.oteapi.blobs import blob_dict
+from execflow.data.oteapi.session import SessionUpdateData
+from execflow.data.oteapi.transformationconfig import TransformationConfigData
+from execflow.oteapi_strategies.registry import get_strategy
 
 if TYPE_CHECKING:  # pragma: no cover
-    from aiida.orm import Dict
+    from collections.abc import MutableMapping
+    from typing import Any
+
+    from aiida.engine import ExitCode, ProcessSpec
     from oteapi.interfaces import ITransformationStrategy
     from oteapi.models import TransformationStatus
+    from plumpy.persistence import LoadSaveContext
+
+DEFAULT_WALLTIME = 2 * 60.0
+"""Time in seconds after which a transformation is given up on."""
+
+POLL_INTERVAL = 0.5
+"""Time in seconds before the first check of the status of a transformation."""
+
+MAX_POLL_INTERVAL = 30.0
+"""Maximum time in seconds between two checks, the time between checks doubles up to it."""
+
+TRANSFORMATION_ID_KEY = "transformation_id"
+"""Key of the session given to the `get` of a strategy, holding the ID of the transformation."""
+
+FINISHED_STATES = (
+    "READY_STATES",
+    "EXCEPTION_STATES",
+    "PROPAGATE_STATES",
+    "SUCCESS",
+    "FAILURE",
+    "REVOKED",
+    "RETRY",
+)
+"""Status values of a finished transformation.
+
+Important:
+    Currently, the status values are valid only for Celery.
+
+    This is because only a single transformation strategy exists (for Celery) and
+    the configuration and status models have been based on this strategy.
+
+    A status enumeration should be set as the type for
+    `TransformationStatus.status` in order to more agnostically determine the state
+    from any transformation strategy.
+
+    However, this is to be implemented in OTEAPI Core.
+"""
+
 
-    from execflow.data.oteapi.transformationconfig import TransformationConfigData
+def is_finished(status: TransformationStatus) -> bool:
+    """Whether or not a transformation is finished, see `FINISHED_STATES`."""
+    return status.status in FINISHED_STATES and bool(status.finishTime)
+
+
+def cancel_transformation(strategy: ITransformationStrategy, transformation_id: str) -> None:
+    """Cancel a transformation, if its strategy has a `cancel(transformation_id)` method."""
+    cancel = getattr(strategy, "cancel", None)
+    if callable(cancel):
+        cancel(transformation_id)
+
+
+def initialize(config: TransformationConfigData, session: dict[str, Any]) -> dict[str, Any]:
+    """Return the session update of initializing an OTE Transformation strategy."""
+    strategy: ITransformationStrategy = get_strategy("transformation", config.get_dict())
+    return strategy.initialize(session)
+
+
+def get(
+    config: TransformationConfigData,
+    session: dict[str, Any],
+    walltime: float = DEFAULT_WALLTIME,
+    interval: float = POLL_INTERVAL,
+    max_interval: float = MAX_POLL_INTERVAL,
+) -> dict[str, Any]:
+    """Return the session update of running an OTE Transformation strategy until it is finished.
+
+    This blocks the worker while waiting for the transformation, see `GetTransformation`
+    for a non-blocking alternative, and for the meaning of `walltime`, `interval` and
+    `max_interval`.
+
+    Raises:
+        TimeoutError: If the transformation did not finish within `walltime` seconds, it
+            is then cancelled.
+
+    """
+    strategy: ITransformationStrategy = get_strategy("transformation", config.get_dict())
+
+    deadline = time() + walltime
+    status = strategy.run(session)
+    while not is_finished(status):
+        if time() >= deadline:
+            cancel_transformation(strategy, status.id)
+            raise TimeoutError(f"The transformation {status.id} did not finish within {walltime} s.")
+        sleep(min(interval, deadline - time()))
+        interval = min(2 * interval, max_interval)
+        status = strategy.status(status.id)
+
+    return strategy.get({**session, TRANSFORMATION_ID_KEY: status.id})
 
 
 @workfunction
-def init_transformation(config: TransformationConfigData, session: Dict) -> Dict:
+def init_transformation(config: TransformationConfigData, session: Dict | SessionUpdateData) -> SessionUpdateData:
     """Initialize an OTE Transformation strategy."""
-    load_strategies(False)
-
-    strategy: ITransformationStrategy = create_strategy("transformation", config.get_dict())
-    updates_for_session = strategy.initialize(session.get_dict())
+    updates_for_session = initialize(config, session.get_dict())
 
     return CalculationFactory("execflow.update_oteapi_session")(
         session=session,
-        updates=DataFactory("core.dict")(updates_for_session),
+        updates=blob_dict(updates_for_session),
     )
 
 
 @workfunction
-def get_transformation(config: TransformationConfigData, session: Dict) -> Dict:
-    """Get an OTE Transformation strategy.
+def get_transformation(config: TransformationConfigData, session: Dict | SessionUpdateData) -> SessionUpdateData:
+    """Get an OTE Transformation strategy, blocking until it is finished.
 
-    Important:
-        Currently, the status values are valid only for Celery.
+    See :py:data:`FINISHED_STATES` for the supported statuses.
+    """
+    updates_for_session = get(config, session.get_dict())
+
+    return CalculationFactory("execflow.update_oteapi_session")(
+        session=session,
+        updates=blob_dict(updates_for_session),
+    )
+
+
+@auto_persist("_transformation_id", "_deadline", "_interval")
+class GetTransformation(Process):
+    """Get an OTE Transformation strategy, waiting for it without blocking the worker.
 
-        This is because only a single transformation strategy exists (for Celery) and
-        the configuration and status models have been based on this strategy.
+    The transformation is run, then its status is checked until it is finished, with
+    exponentially increasing intervals in between. Meanwhile, the process is waiting,
+    and can be killed. The transformation is cancelled when the process is killed or
+    exceeds the walltime, if its strategy has a `cancel(transformation_id)` method.
 
-        A status enumeration should be set as the type for
-        `TransformationStatus.status` in order to more agnostically determine the state
-        from any transformation strategy.
+    Inputs:
+        - **config** (:py:class:`~execflow.data.oteapi.transformationconfig.TransformationConfigData`)
+          -- The configuration of the transformation.
+        - **session** (:py:class:`aiida.orm.Dict`,
+          :py:class:`~execflow.data.oteapi.session.SessionUpdateData`) -- The OTE session.
+        - **walltime** (:py:class:`aiida.orm.Float`) -- Time in seconds after which
+          the transformation is given up on.
+        - **interval** (:py:class:`aiida.orm.Float`) -- Time in seconds before the first
+          check of the status.
+        - **max_interval** (:py:class:`aiida.orm.Float`) -- Maximum time in seconds
+          between two checks of the status.
 
-        However, this is to be implemented in OTEAPI Core.
+    Outputs:
+        - **result** (:py:class:`~execflow.data.oteapi.session.SessionUpdateData`) --
+          The updated OTE session.
+
+    Exit Codes:
+        - **400** (*ERROR_WALLTIME_EXCEEDED*) -- The transformation did not finish
+          within the walltime.
 
     """
-    load_strategies(False)
-
-    strategy: ITransformationStrategy = create_strategy("transformation", config.get_dict())
-
-    wall_time = 2 * 60  # 2 min.
-
-    start_time = time()
-    status: TransformationStatus = strategy.run(session.get_dict())
-    while (
-        status.status
-        not in (
-            "READY_STATES",
-            "EXCEPTION_STATES",
-            "PROPAGATE_STATES",
-            "SUCCESS",
-            "FAILURE",
-            "REVOKED",
-            "RETRY",
+
+    _node_class = WorkflowNode
+
+    # Set when the transformation is run
+    _transformation_id: str = ""
+    _deadline: float = 0.0
+    _interval: float = 0.0
+    # Not persisted, a new instance is created when the process is reloaded
+    _strategy: ITransformationStrategy | None = None
+
+    @classmethod
+    def define(cls, spec: ProcessSpec) -> None:
+        super().define(spec)
+
+        spec.input("config", valid_type=TransformationConfigData)
+        spec.input("session", valid_type=(Dict, SessionUpdateData))
+        spec.input("walltime", valid_type=Float, default=lambda: Float(DEFAULT_WALLTIME))
+        spec.input("interval", valid_type=Float, default=lambda: Float(POLL_INTERVAL))
+        spec.input("max_interval", valid_type=Float, default=lambda: Float(MAX_POLL_INTERVAL))
+        spec.output("result", valid_type=SessionUpdateData)
+
+        spec.exit_code(400, "ERROR_WALLTIME_EXCEEDED", message="The transformation did not finish within the walltime.")
+
+    def get_transformation_strategy(self) -> ITransformationStrategy:
+        """Return the strategy, the same instance for the run, status and get of the transformation."""
+        if self._strategy is None:
+            self._strategy = get_strategy("transformation", self.inputs.config.get_dict())
+        return self._strategy
+
+    def run(self) -> Wait | ExitCode | None:
+        """Run the transformation."""
+        status = self.get_transformation_strategy().run(self.inputs.session.get_dict())
+        self._transformation_id = status.id
+        self._deadline = time() + self.inputs.walltime.value
+        self._interval = self.inputs.interval.value
+        return self.process_status(status)
+
+    def check_status(self) -> Wait | ExitCode | None:
+        """Check the status of the transformation, once woken up."""
+        self._interval = min(2 * self._interval, self.inputs.max_interval.value)
+        return self.process_status(self.get_transformation_strategy().status(self._transformation_id))
+
+    def process_status(self, status: TransformationStatus) -> Wait | ExitCode | None:
+        """Get the transformation if it is finished, otherwise wait for the next check."""
+        if is_finished(status):
+            self.finalize()
+            return None
+
+        if time() >= self._deadline:
+            self.report(f"The transformation {self._transformation_id} did not finish, last status: {status.status}")
+            cancel_transformation(self.get_transformation_strategy(), self._transformation_id)
+            return self.exit_codes.ERROR_WALLTIME_EXCEEDED
+
+        self.node.set_process_status(f"Transformation {self._transformation_id}: {status.status}")
+        self.schedule_check()
+        return Wait(self.check_status, f"Waiting for transformation {self._transformation_id}")
+
+    def schedule_check(self) -> None:
+        """Wake the process up for the next check of the status."""
+        self.loop.call_later(min(self._interval, max(self._deadline - time(), 0)), self.wake_up)
+
+    def wake_up(self) -> None:
+        if self.paused:
+            self.schedule_check()
+        elif self.state == ProcessState.WAITING:
+            # Not waiting anymore if it was killed meanwhile
+            self.resume()
+
+    def finalize(self) -> None:
+        """Set the `result` output, holding the updated session."""
+        session = self.inputs.session
+        updates_for_session = self.get_transformation_strategy().get(
+            {**session.get_dict(), TRANSFORMATION_ID_KEY: self._transformation_id}
+        )
+        self.out(
+            "result",
+            run(
+                CalculationFactory("execflow.update_oteapi_session"),
+                session=session,
+                updates=blob_dict(updates_for_session),
+            ),
         )
-        or not status.finishTime
-    ) and (time() - start_time) < wall_time:
-        sleep(0.5)
-        status = strategy.status(status.id)
 
-    updates_for_session = strategy.get(session.get_dict())
+    def load_instance_state(self, saved_state: MutableMapping[str, Any], load_context: LoadSaveContext) -> None:
+        super().load_instance_state(saved_state, load_context)
+        if self.state == ProcessState.WAITING:
+            self.schedule_check()
 
-    return CalculationFactory("execflow.update_oteapi_session")(
-        session=session,
-        updates=DataFactory("core.dict")(updates_for_session),
-    )
+    def on_killed(self) -> None:
+        super().on_killed()
+        if self._transformation_id:
+            cancel_transformation(self.get_transformation_strategy(), self._transformation_id)
@@ -0,0 +1,170 @@
+"""Content-addressed staging of input files on remote computers.
+
+Large static input files are uploaded once per computer to a staging directory, keyed
+by the AiiDA hash of their node, and symlinked into the working directory of every job
+that uses them afterwards.
+
+The staging directory defaults to ``execflow_staging`` in the work directory of the
+computer, and is kept in bounds by evicting the least recently used files. All three
+can be configured through computer properties, e.g.:
+
+.. code-block:: python
+
+    computer = load_computer("localhost")
+    computer.set_property(STAGING_DIR_PROPERTY, "/scratch/execflow_staging")
+    computer.set_property(STAGING_MAX_SIZE_PROPERTY, 50 * 1024**3)  # bytes
+    computer.set_property(STAGING_MAX_AGE_PROPERTY, 7 * 24 * 3600)  # seconds
+
+Eviction only happens when a new file is staged, and skips the files that are inputs of
+calculations that have not terminated yet.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+import posixpath
+import shlex
+import shutil
+from tempfile import TemporaryDirectory
+from typing import TYPE_CHECKING
+from urllib.parse import quote
+from uuid import uuid4
+
+from aiida.engine import calcfunction
+from aiida.orm import ProcessNode, QueryBuilder, RemoteData, SinglefileData, Str, load_computer
+
+from execflow.utils.submission_queue import ACTIVE_STATES
+
+if TYPE_CHECKING:  # pragma: no cover
+    from aiida.orm import Computer
+    from aiida.transports import Transport
+
+STAGING_DIR_PROPERTY = "execflow_staging_dir"
+"""Name of the computer property holding the path of the staging directory."""
+
+STAGING_MAX_SIZE_PROPERTY = "execflow_staging_max_size"
+"""Name of the computer property holding the maximum size of the staging directory in bytes."""
+
+STAGING_MAX_AGE_PROPERTY = "execflow_staging_max_age"
+"""Name of the computer property holding the time in seconds after which unused files are evicted."""
+
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+
+EVICT_SCRIPT = """cd {root} || exit 0
+keep=" {keep} "
+find . -mindepth 1 -maxdepth 1 -type d -mmin +{max_age} | while read -r entry; do
+    case "$keep" in *" ${{entry#./}} "*) continue ;; esac
+    rm -rf "$entry"
+done
+if [ -n "{max_size}" ]; then
+    total=$(du -sk . | cut -f1)
+    for entry in $(ls -tr); do
+        [ "$total" -le "{max_size}" ] && break
+        case "$keep" in *" $entry "*) continue ;; esac
+        size=$(du -sk "$entry" | cut -f1)
+        rm -rf "$entry"
+        total=$((total - size))
+    done
+fi
+"""
+
+
+def get_staging_dir(computer: Computer, transport: Transport) -> str:
+    """Return the path of the staging directory of a computer."""
+    staging_dir = computer.get_property(STAGING_DIR_PROPERTY, None)
+    if staging_dir is None:
+        workdir = computer.get_workdir().format(username=transport.whoami())
+        staging_dir = f"{workdir.rstrip('/')}/execflow_staging"
+    return staging_dir
+
+
+def get_in_use(computer: Computer, root: str) -> set[str]:
+    """Return the entries of a staging directory that are inputs of processes that have not terminated."""
+    query = QueryBuilder()
+    query.append(
+        RemoteData,
+        filters={"dbcomputer_id": computer.pk, "attributes.remote_path": {"like": f"{root}/%"}},
+        project=["attributes.remote_path"],
+        tag="remote",
+    )
+    query.append(ProcessNode, with_incoming="remote", filters={"attributes.process_state": {"in": ACTIVE_STATES}})
+    return {posixpath.relpath(path, root).split("/", 1)[0] for (path,) in query.distinct().iterall()}
+
+
+def evict(computer: Computer, transport: Transport, root: str, keep: str) -> None:
+    """Evict the staged files that are too old, then the least recently used ones until under the size limit.
+
+    The files that are inputs of processes that have not terminated are never evicted.
+
+    Parameters:
+        computer: The computer to evict staged files from.
+        transport: An open transport to the computer.
+        root: The staging directory.
+        keep: The entry of the staging directory that must not be evicted.
+
+    """
+    max_size = computer.get_property(STAGING_MAX_SIZE_PROPERTY, None)
+    max_age = computer.get_property(STAGING_MAX_AGE_PROPERTY, DEFAULT_MAX_AGE)
+    transport.exec_command_wait(
+        EVICT_SCRIPT.format(
+            root=shlex.quote(root),
+            # Entries are hashes, safe to list in the script
+            keep=" ".join(sorted({keep} | get_in_use(computer, root))),
+            max_age=max(max_age // 60, 0),
+            max_size="" if max_size is None else max_size // 1024,
+        )
+    )
+
+
+def stage_file(node: SinglefileData, filename: str, computer: Computer) -> RemoteData:
+    """Make sure the content of a node is staged on a computer.
+
+    The staging is recorded by a calcfunction, linking the returned `RemoteData` to the node.
+
+    Parameters:
+        node: The stored node holding the file to stage.
+        filename: The name of the file in the working directory of the jobs.
+        computer: The computer to stage the file on.
+
+    Returns:
+        A stored `RemoteData` of the directory holding the staged file, whose content is
+        to be symlinked into the working directory.
+
+    """
+    return upload_file(node, Str(filename), Str(computer.label))
+
+
+@calcfunction
+def upload_file(node: SinglefileData, filename: Str, computer: Str) -> RemoteData:
+    """Upload the content of a node to the staging directory of a computer, unless it is already there."""
+    key = node.base.caching.get_hash()
+    filename = filename.value
+    computer = load_computer(computer.value)
+
+    with computer.get_transport() as transport:
+        root = get_staging_dir(computer, transport)
+        # One directory per filename, whose whole content is linked into the working directory
+        directory = f"{root}/{key}/{quote(filename, safe='')}"
+        path = f"{directory}/{filename}"
+
+        if transport.path_exists(path):
+            # Mark it as recently used
+            transport.exec_command_wait(f"touch {shlex.quote(f'{root}/{key}')}")
+        else:
+            transport.makedirs(posixpath.dirname(path), ignore_existing=True)
+            with TemporaryDirectory() as tmp:
+                local = Path(tmp) / Path(filename).name
+                with node.open(mode="rb") as source, local.open("wb") as target:
+                    shutil.copyfileobj(source, target)
+
+                # Concurrent jobs never see a partially uploaded file
+                partial = f"{path}.{uuid4().hex}.part"
+                transport.putfile(str(local), partial)
+                # Not `transport.rename`, which refuses new destinations with the local transport
+                retval, _, stderr = transport.exec_command_wait(f"mv {shlex.quote(partial)} {shlex.quote(path)}")
+                if retval != 0:
+                    raise OSError(f"Failed to stage {filename} on {computer.label}: {stderr}")
+
+            evict(computer, transport, root, key)
+
+    return RemoteData(computer=computer, remote_path=directory)
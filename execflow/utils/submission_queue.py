@@ -0,0 +1,167 @@
+"""Priority and fair-share submission queue shared by all ExecFlow workchains.
+
+The queue does not hold any state of its own: the in-flight calculations per computer
+and the chains waiting for a free slot are both read from the database, so the queue is
+shared between all workchains of all daemon workers and survives restarts.
+
+A computer is only throttled if it has a concurrency cap configured, e.g.:
+
+.. code-block:: python
+
+    load_computer("localhost").set_property(MAX_CONCURRENT_PROPERTY, 4)
+
+Waiting chains are released in order of descending priority, then by the number of
+calculations their user already has running on the computer (fair-share), and finally by
+the time they started waiting. The caps are best-effort: chains that check the queue at
+the exact same moment from different workers may briefly overshoot them.
+
+The same information is used to spread submissions over several equivalent computers,
+see :py:func:`select_code` and :py:func:`select_computer`.
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+from time import time
+from typing import TYPE_CHECKING
+
+from aiida import orm
+
+if TYPE_CHECKING:  # pragma: no cover
+    from typing import Any
+
+MAX_CONCURRENT_PROPERTY = "execflow_max_concurrent"
+"""Name of the computer property holding the maximum number of concurrent calculations."""
+
+QUEUE_EXTRA = "execflow_queue"
+"""Name of the extra marking a workchain node as waiting for a submission slot."""
+
+ACTIVE_STATES = ("created", "waiting", "running")
+
+
+def get_step_computer(inputs: dict[str, Any]) -> orm.Computer | None:
+    """Return the computer a process with the given (resolved) inputs will run on."""
+    code = inputs.get("code")
+    if isinstance(code, orm.AbstractCode) and getattr(code, "computer", None) is not None:
+        return code.computer
+
+    computer = inputs.get("metadata", {}).get("computer")
+    if isinstance(computer, orm.Computer):
+        return computer
+    if isinstance(computer, str):
+        return orm.load_computer(computer)
+    return None
+
+
+def get_max_concurrent(computer: orm.Computer) -> int | None:
+    """Return the concurrency cap of a computer, `None` if it is not capped."""
+    return computer.get_property(MAX_CONCURRENT_PROPERTY, None)
+
+
+def get_in_flight(computer: orm.Computer) -> list[orm.CalcJobNode]:
+    """Return the calculations that are currently active on a computer, oldest first."""
+    query = orm.QueryBuilder()
+    query.append(
+        orm.CalcJobNode, filters={"attributes.process_state": {"in": ACTIVE_STATES}}, project=["*"], tag="calc"
+    )
+    query.append(orm.Computer, with_node="calc", filters={"id": computer.pk})
+    query.order_by({"calc": {"ctime": "asc"}})
+    return [node for (node,) in query.iterall()]
+
+
+def get_in_flight_per_user(computer: orm.Computer) -> Counter[int]:
+    """Return the number of calculations that are currently active on a computer, per user pk."""
+    query = orm.QueryBuilder()
+    query.append(
+        orm.CalcJobNode, filters={"attributes.process_state": {"in": ACTIVE_STATES}}, project=["user_id"], tag="calc"
+    )
+    query.append(orm.Computer, with_node="calc", filters={"id": computer.pk})
+    return Counter(user for (user,) in query.iterall())
+
+
+def _query_waiting(computer: orm.Computer, project: list[str] | None = None) -> orm.QueryBuilder:
+    query = orm.QueryBuilder()
+    query.append(
+        orm.WorkflowNode,
+        filters={
+            "attributes.process_state": {"in": ACTIVE_STATES},
+            f"extras.{QUEUE_EXTRA}.computer": computer.pk,
+        },
+        project=project or ["*"],
+    )
+    return query
+
+
+def get_waiting(computer: orm.Computer) -> list[orm.WorkflowNode]:
+    """Return the active workchains waiting for a slot on a computer, in release order."""
+    in_flight = get_in_flight_per_user(computer)
+    ranked = []
+    for node, user, queued in _query_waiting(computer, ["*", "user_id", f"extras.{QUEUE_EXTRA}"]).iterall():
+        ranked.append(((-queued["priority"], in_flight[user], queued["since"]), node))
+    return [node for _, node in sorted(ranked, key=lambda item: item[0])]
+
+
+def request_slot(
+    node: orm.WorkflowNode, computer: orm.Computer | None, priority: int = 0
+) -> list[orm.CalcJobNode] | None:
+    """Request a slot to submit a calculation to a computer.
+
+    If the slot is granted, the waiting mark of the workchain is removed and `None` is
+    returned. Otherwise, the workchain is marked as waiting and the in-flight calculations
+    of the computer are returned: the workchain should wait for any of them to terminate
+    and request a slot again.
+
+    Parameters:
+        node: The node of the workchain that wants to submit.
+        computer: The computer the calculation will run on.
+        priority: The priority of the submission, higher values are released first.
+
+    """
+    max_concurrent = None if computer is None else get_max_concurrent(computer)
+    if computer is None or max_concurrent is None:
+        release_slot(node)
+        return None
+
+    queued = node.base.extras.get(QUEUE_EXTRA, None)
+    if queued is None or queued["computer"] != computer.pk or queued["priority"] != priority:
+        node.base.extras.set(QUEUE_EXTRA, {"computer": computer.pk, "priority": priority, "since": time()})
+
+    in_flight = get_in_flight(computer)
+    free = max_concurrent - len(in_flight)
+    waiting = [_.pk for _ in get_waiting(computer)]
+    # A workchain that is not active, e.g. not yet running, is not listed and comes last
+    position = waiting.index(node.pk) if node.pk in waiting else len(waiting)
+
+    # Without in-flight calculations there is nothing to wait for
+    if not in_flight or (free > 0 and position < free):
+        release_slot(node)
+        return None
+
+    return in_flight
+
+
+def release_slot(node: orm.WorkflowNode) -> None:
+    """Remove the waiting mark of a workchain, if any."""
+    if QUEUE_EXTRA in node.base.extras:
+        node.base.extras.delete(QUEUE_EXTRA)
+
+
+def get_load(computer: orm.Computer) -> float:
+    """Return the load of a computer.
+
+    The load is the number of active calculations plus the number of workchains waiting
+    for a slot, relative to the concurrency cap of the computer if it has one.
+    """
+    load = len(get_in_flight(computer)) + _query_waiting(computer).count()
+    max_concurrent = get_max_concurrent(computer)
+    return load / max_concurrent if max_concurrent else load
+
+
+def select_computer(computers: list[orm.Computer]) -> orm.Computer:
+    """Return the least loaded of several equivalent computers, the first one on ties."""
+    return min(computers, key=get_load)
+
+
+def select_code(codes: list[orm.AbstractCode]) -> orm.AbstractCode:
+    """Return the code on the least loaded computer of several equivalent codes."""
+    return min(codes, key=lambda code: get_load(code.computer))
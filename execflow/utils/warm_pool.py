@@ -0,0 +1,332 @@
+"""Warm pool of Python tools.
+
+Running ``python path/to/warm_pool.py <module> <arguments>`` behaves like
+``python -m <module> <arguments>``: the module runs as `__main__` in the current
+directory, with the environment, stdin, stdout, stderr and exit status of the caller.
+The module is however run by a long-lived local server, which imported it once when it
+started and forks a copy of itself for every run. Interpreter and library startup is
+therefore only paid once, runs are isolated from each other and run concurrently.
+
+The server of a module is started by the first run and stops after being idle for
+`IDLE_TIMEOUT` seconds, when the files of the package of the module are modified, or
+with :py:func:`stop_server`. Its log is written next to its socket, see
+:py:func:`get_socket_path`. The main code of the module must be guarded by
+``if __name__ == "__main__"`` (or be in the `__main__` module of a package), since the
+module is imported by the server.
+
+The sockets are in a directory only accessible by the user, in `$XDG_RUNTIME_DIR` or
+else in the temporary directory, since the callers pass their environment to the
+server. The directory is checked to be owned by the user and private before use.
+
+The script is run by path rather than with ``-m execflow.utils.warm_pool``, which would
+import the `execflow` package on every run.
+
+This relies on `fork` and on passing file descriptors over Unix sockets, so it is only
+available on POSIX systems, and for Python tools only.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import fcntl
+from hashlib import sha256
+import importlib
+import json
+import os
+from pathlib import Path
+import runpy
+import signal
+import socket
+import stat
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+IDLE_TIMEOUT = 600
+"""Number of seconds after which an idle server stops."""
+
+START_TIMEOUT = 60
+"""Number of seconds to wait for a server to start, including the import of its module."""
+
+SCRIPT = Path(__file__).resolve()
+"""Path of this script, run by the callers and the servers."""
+
+HEADER = struct.Struct("!Q")
+STATUS = struct.Struct("!i")
+STARTED = b"R"
+
+
+def get_runtime_dir() -> Path:
+    """Return the directory of the sockets of the user, created if needed.
+
+    Raises:
+        PermissionError: If the directory is not owned by the user or accessible by others.
+
+    """
+    if os.environ.get("XDG_RUNTIME_DIR"):
+        path = Path(os.environ["XDG_RUNTIME_DIR"]) / "execflow_warm"
+    else:
+        path = Path(tempfile.gettempdir()) / f"execflow_warm_{os.getuid()}"
+    path.mkdir(mode=0o700, exist_ok=True)
+
+    # Not followed, another user may have created it, or a link to it, first
+    info = path.lstat()
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise PermissionError(f"{path} must be a directory owned by the user and only accessible by them")
+    return path
+
+
+def get_socket_path(module: str) -> Path:
+    """Return the path of the socket of the server of a module."""
+    key = sha256(f"{sys.executable}:{module}".encode()).hexdigest()[:16]
+    return get_runtime_dir() / f"{key}.sock"
+
+
+def get_mtimes(module: str) -> dict[str, float]:
+    """Return the modification times of the files of the imported modules of the package of a module."""
+    package = module.split(".", 1)[0]
+    mtimes = {}
+    for name, imported in list(sys.modules.items()):
+        path = getattr(imported, "__file__", None)
+        if path and (name == package or name.startswith(f"{package}.")):
+            with contextlib.suppress(OSError):
+                mtimes[path] = Path(path).stat().st_mtime
+    return mtimes
+
+
+def is_stale(mtimes: dict[str, float]) -> bool:
+    """Return whether any of the files has been modified or removed since it was imported."""
+    for path, mtime in mtimes.items():
+        try:
+            if Path(path).stat().st_mtime != mtime:
+                return True
+        except OSError:
+            return True
+    return False
+
+
+def recv_exactly(connection: socket.socket, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = connection.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed")
+        data += chunk
+    return data
+
+
+def get_exit_status(code) -> int:
+    """Return the exit status of a `SystemExit` code, as the interpreter does."""
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def run_request(connection: socket.socket) -> int:
+    """Run a request in the forked process of the server, in place of the caller."""
+    header, fds, _, _ = socket.recv_fds(connection, HEADER.size, 3)
+    request = json.loads(recv_exactly(connection, HEADER.unpack(header)[0]))
+    for fd, target in zip(fds, (0, 1, 2)):
+        os.dup2(fd, target)
+        os.close(fd)
+
+    os.chdir(request["cwd"])
+    os.environ.clear()
+    os.environ.update(request["env"])
+    sys.path.insert(0, request["cwd"])
+    sys.argv = [request["module"], *request["arguments"]]
+    connection.sendall(STARTED)
+
+    try:
+        runpy.run_module(request["module"], run_name="__main__", alter_sys=True)
+    except SystemExit as exception:
+        return get_exit_status(exception.code)
+    except BaseException:  # noqa: BLE001
+        traceback.print_exc()
+        return 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    return 0
+
+
+def serve(module: str, idle_timeout: float = IDLE_TIMEOUT) -> None:
+    """Serve the runs of a module until idle for `idle_timeout` seconds."""
+    path = get_socket_path(module)
+    # Not truncated before being locked, it holds the PID of the server for `stop_server`
+    with Path(f"{path}.lock").open("a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            # Already served
+            return
+        lock.truncate(0)
+        lock.write(str(os.getpid()))
+        lock.flush()
+
+        # Do not shadow the module by the neighbours of this script
+        sys.path[:] = [_ for _ in sys.path if Path(_ or ".").resolve() != SCRIPT.parent]
+        importlib.import_module(module)
+        mtimes = get_mtimes(module)
+
+        path.unlink(missing_ok=True)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+            server.bind(str(path))
+            server.listen()
+            server.settimeout(idle_timeout)
+            # Forked processes are reaped automatically, and the socket is removed on `stop_server`
+            signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+            try:
+                while True:
+                    try:
+                        connection, _ = server.accept()
+                    except TimeoutError:
+                        break
+
+                    if is_stale(mtimes):
+                        # Refused, the caller starts a server with the new code
+                        path.unlink(missing_ok=True)
+                        connection.close()
+                        break
+
+                    with connection:
+                        if os.fork() == 0:
+                            # The lock is released with the server, not once all runs are done
+                            lock.close()
+                            server.close()
+                            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                            status = 1
+                            try:
+                                status = run_request(connection)
+                            finally:
+                                with contextlib.suppress(OSError):
+                                    connection.sendall(STATUS.pack(status))
+                                os._exit(0)
+            finally:
+                path.unlink(missing_ok=True)
+
+
+def start_server(module: str, idle_timeout: float) -> None:
+    path = get_socket_path(module)
+    with Path(f"{path}.log").open("a") as log:
+        subprocess.Popen(
+            [sys.executable, str(SCRIPT), "--serve", "--idle-timeout", str(idle_timeout), module],
+            cwd=path.parent,
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=log,
+            start_new_session=True,
+        )
+
+
+def is_running(module: str) -> bool:
+    """Return whether the server of a module is running, or starting."""
+    with Path(f"{get_socket_path(module)}.lock").open("a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return True
+        fcntl.flock(lock, fcntl.LOCK_UN)
+        return False
+
+
+def stop_server(module: str) -> None:
+    """Stop the server of a module, if running."""
+    path = get_socket_path(module)
+    try:
+        pid = int(Path(f"{path}.lock").read_text())
+    except (OSError, ValueError):
+        return
+
+    with Path(f"{path}.lock").open("r") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            # Locked, so the process is the running server
+            os.kill(pid, signal.SIGTERM)
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def send_request(module: str, arguments: list[str]) -> int | None:
+    """Run a module by its server, return its exit status or `None` if the server did not take the request."""
+    request = json.dumps(
+        {"module": module, "arguments": arguments, "cwd": str(Path.cwd()), "env": dict(os.environ)}
+    ).encode()
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client, contextlib.ExitStack() as stack:
+        fds = []
+        for fd in (0, 1, 2):
+            try:
+                os.fstat(fd)
+            except OSError:
+                # Closed by the caller, the run gets /dev/null instead
+                fd = stack.enter_context(Path(os.devnull).open("r+")).fileno()  # noqa: PLW2901
+            fds.append(fd)
+
+        try:
+            client.connect(str(get_socket_path(module)))
+            socket.send_fds(client, [HEADER.pack(len(request))], fds)
+            client.sendall(request)
+            if client.recv(1) != STARTED:
+                return None
+        except (ConnectionError, FileNotFoundError):
+            return None
+
+        try:
+            return STATUS.unpack(recv_exactly(client, STATUS.size))[0]
+        except ConnectionError:
+            return 1
+
+
+def run(module: str, arguments: list[str], idle_timeout: float = IDLE_TIMEOUT) -> int:
+    """Run a module by its server, starting the server if needed, and return the exit status."""
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    started = time.monotonic()
+    delay = 0.05
+    while True:
+        status = send_request(module, arguments)
+        if status is not None:
+            return status
+
+        if time.monotonic() - started > START_TIMEOUT:
+            print(
+                f"The warm pool of `{module}` did not start, see {get_socket_path(module)}.log",
+                file=sys.stderr,
+            )
+            return 1
+        if not is_running(module):
+            # Not started yet, or stopped e.g. since its code was modified
+            start_server(module, idle_timeout)
+        time.sleep(delay)
+        delay = min(2 * delay, 1)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog=f"python {SCRIPT}", description=__doc__.splitlines()[0])
+    parser.add_argument("--serve", action="store_true", help="Run the server of the module.")
+    parser.add_argument("--idle-timeout", type=float, default=IDLE_TIMEOUT)
+    parser.add_argument("module")
+    parser.add_argument("arguments", nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        serve(args.module, args.idle_timeout)
+        return 0
+    return run(args.module, args.arguments, args.idle_timeout)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
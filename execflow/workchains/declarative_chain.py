@@ -1,17 +1,25 @@
 from __future__ import annotations
 
 import ast
+import json
 from pathlib import Path
+from time import time
 from urllib.parse import urlsplit
 
 from aiida import orm
-from aiida.engine import ExitCode, ToContext, WorkChain, run_get_node, while_
+from aiida.engine import CalcJob, ExitCode, ToContext, WorkChain, append_, run_get_node, while_
 from aiida.engine.utils import is_process_function
+from aiida.manage import get_manager
 from aiida.orm import (
     Data,
     Dict,
+    Float,
+    Group,
+    Int,
     List,
     Node,
+    QueryBuilder,
+    RemoteData,
     SinglefileData,
     Str,
     load_code,
@@ -26,8 +34,11 @@ import jsonref
 from jsonschema import validate
 import plumpy
 import requests
+from sqlalchemy import event
 import yaml
 
+from execflow.utils import submission_queue
+
 # Copied from https://github.com/aiidalab/aiidalab/blob/90b334e6a473393ba22b915fdaf85d917fd947f4/aiidalab/registry/yaml.py
 # licensed under the MIT license
 REQUESTS = cachecontrol.CacheControl(requests.Session())
@@ -78,6 +89,10 @@ schema = {
                 "steps": {"type": "array"},
                 "node": {"type": "integer"},
                 "error": {"type": "object"},
+                "priority": {"type": ["integer", "string"]},
+                "timeout": {"type": ["number", "string"]},
+                "on_timeout": {"type": "array"},
+                "symlink_parent": {"type": "boolean"},
             },
             "additionalProperties": False,
             "title": "Step",
@@ -154,13 +169,57 @@ def dict2structure(d):
 
 
 def dict2code(d):
+    # Several equivalent codes, pick the one on the least loaded computer
+    if isinstance(d, list):
+        return submission_queue.select_code([load_code(_) for _ in d])
     return load_code(d)
 
 
-def dict2upf(d):
+# Worker-wide cache of the pseudopotential families: group label -> {element: pk}
+PSEUDO_FAMILIES = {}
+
+
+def get_pseudo_family(label):
+    if label not in PSEUDO_FAMILIES:
+        query = QueryBuilder().append(Group, filters={"label": label}, tag="group")
+        query.append(Data, with_group="group", project=["id", "attributes.element"])
+        pseudos = {element: pk for pk, element in query.iterall()}
+        if not pseudos:
+            # Raises if the group does not exist
+            load_group(label)
+        PSEUDO_FAMILIES[label] = pseudos
+    return PSEUDO_FAMILIES[label]
+
+
+def get_pseudo_pk(d):
     validate(instance=d, schema=upfschema)
-    group = load_group(d["group"])
-    return group.get_pseudo(element=d["element"])
+    if d["element"] not in get_pseudo_family(d["group"]):
+        # The element may have been added to the family since it was cached
+        PSEUDO_FAMILIES.pop(d["group"], None)
+    try:
+        return get_pseudo_family(d["group"])[d["element"]]
+    except KeyError as exception:
+        raise ValueError(f"family `{d['group']}` does not contain pseudo for element `{d['element']}`") from exception
+
+
+def dict2upf(d):
+    return dict2upfs({"pseudo": d})["pseudo"]
+
+
+def dict2upfs(d, retry=True):
+    # Resolve a whole namespace of pseudos with a single query
+    pks = {k: get_pseudo_pk(v) for k, v in d.items()}
+    query = QueryBuilder().append(Group, filters={"label": {"in": list({v["group"] for v in d.values()})}}, tag="group")
+    query.append(Node, with_group="group", filters={"id": {"in": list(set(pks.values()))}})
+    nodes = {node.pk: node for (node,) in query.iterall()}
+
+    if retry and len(nodes) != len(set(pks.values())):
+        # A pseudo was deleted or removed from its family since it was cached, reload them
+        for v in d.values():
+            PSEUDO_FAMILIES.pop(v["group"], None)
+        return dict2upfs(d, retry=False)
+
+    return {k: nodes[pk] for k, pk in pks.items()}
 
 
 # TODO: implement for old upfs?
@@ -180,6 +239,11 @@ def dict2kpoints(d):
 def dict2datanode(dat, typ, dynamic=False):
     # Resolve recursively
     if dynamic:
+        if issubclass(typ, (UpfData, orm.nodes.data.upf.UpfData)) and all(
+            isinstance(v, dict) and "node" not in v for v in dat.values()
+        ):
+            return dict2upfs(dat)
+
         out = {}
         for k in dat:
             # Is there only 1 level of dynamisism?
@@ -235,16 +299,108 @@ def set_dot2index(d, key, val):
     return set_dot2index(d[t], key[1:], val)
 
 
+def materialize(obj):
+    if isinstance(obj, jsonref.JsonRef):
+        obj = obj.__subject__
+    if isinstance(obj, dict):
+        return {k: materialize(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [materialize(v) for v in obj]
+    return obj
+
+
+# Extra holding the pk of the child killed for exceeding its walltime budget
+TIMED_OUT_EXTRA = "execflow_timed_out"
+
+
+class Scratch(dict):
+    """Scratch values of a workchain, failing clearly on the values lost on a restart."""
+
+    def __init__(self, values, lost=()):
+        super().__init__(values)
+        self.lost = set(lost)
+
+    def __missing__(self, key):
+        if key in self.lost:
+            # Not a `KeyError`, which Jinja would silently render as undefined
+            raise ValueError(
+                f"scratch value `{key}` was lost when the workchain was restarted, only stored nodes are reloaded;"
+                " set it again with `to_scratch` before reading it"
+            )
+        raise KeyError(key)
+
+
+def find_nodes(inputs):
+    if isinstance(inputs, Node):
+        return [inputs]
+    if isinstance(inputs, dict):
+        return [node for k, v in inputs.items() if k != "metadata" for node in find_nodes(v)]
+    return []
+
+
+def find_remote_data(inputs):
+    return [node for node in find_nodes(inputs) if isinstance(node, RemoteData)]
+
+
+def store_nodes(inputs):
+    """Store all unstored input nodes in a single transaction, rather than one per node at launch."""
+    unstored = {id(node): node for node in find_nodes(inputs) if not node.is_stored}
+    if not unstored:
+        return
+
+    storage = get_manager().get_profile_storage()
+    if any(storage.autogroup.is_to_be_grouped(node) for node in unstored.values()):
+        # Adding a node to the autogroup, e.g. under `verdi run`, commits on its own
+        for node in unstored.values():
+            node.store()
+        return
+
+    def flush(session, instance):
+        # Without a transaction of its own, a node is only flushed on commit, but it is
+        # hashed right after being added, which requires its id
+        session.flush([instance])
+
+    with storage.transaction() as session:
+        event.listen(session, "transient_to_pending", flush)
+        try:
+            for node in unstored.values():
+                node.store(with_transaction=False)
+        finally:
+            event.remove(session, "transient_to_pending", flush)
+
+
 class DeclarativeChain(WorkChain):
     @classmethod
     def define(cls, spec):
         super().define(spec)
         spec.input("workchain_specification", valid_type=(SinglefileData, Str))
+        spec.input(
+            "priority",
+            valid_type=Int,
+            default=lambda: Int(0),
+            help="Priority of the calcjobs submitted by this chain on computers with a concurrency cap.",
+        )
+        spec.input(
+            "timeout",
+            valid_type=(Int, Float),
+            required=False,
+            help="Walltime budget of the whole chain in seconds.",
+        )
         spec.exit_code(2, "ERROR_SUBPROCESS", message="A subprocess has failed.")
+        spec.exit_code(3, "ERROR_TIMEOUT", message="A walltime budget was exceeded.")
+        spec.exit_code(
+            4,
+            "ERROR_REMOTE_COMPUTER",
+            message="A calcjob cannot run on the computer of its RemoteData inputs, which cannot be copied over.",
+        )
 
         spec.outline(
             cls.setup,
-            while_(cls.not_finished)(cls.submit_next, cls.process_current),
+            while_(cls.not_finished)(
+                cls.submit_next,
+                while_(cls.is_queued)(cls.submit_next),
+                cls.process_current,
+            ),
             cls.finalize,
         )
         spec.output_namespace("results", dynamic=True)
@@ -252,6 +408,11 @@ class DeclarativeChain(WorkChain):
     def setup(self):
         self.ctx.current_id = 0
         self.ctx.results = {}
+        self.ctx.queued = False
+        self.ctx.queued_inputs = None
+        self.ctx.start_time = time()
+        self.ctx.timeout_child = None
+        self.ctx.timed_out = False
         if isinstance(self.inputs["workchain_specification"], Str):
             full_file = Path(self.inputs["workchain_specification"].value).resolve()
             directory = str(full_file.parent)
@@ -260,47 +421,160 @@ class DeclarativeChain(WorkChain):
             with full_file.open() as handle:
                 file_content = handle.read()
                 file_content = file_content.replace("__DIR__", directory)
-                if ext in (".yaml", ".yml"):
-                    tspec = yaml.safe_load(file_content)
-                    spec = jsonref.JsonRef.replace_refs(tspec, loader=my_fancy_loader)
-                else:
-                    spec = jsonref.load(file_content)
-
         else:
             ext = Path(self.inputs["workchain_specification"].filename).suffix
             with self.inputs["workchain_specification"].open(mode="r") as handle:
-                if ext in (".yaml", ".yml"):
-                    tspec = yaml.safe_load(handle.read())
-                    spec = jsonref.JsonRef.replace_refs(tspec, loader=my_fancy_loader)
-                else:
-                    spec = jsonref.load(handle)
+                file_content = handle.read()
+
+        spec = yaml.safe_load(file_content) if ext in (".yaml", ".yml") else json.loads(file_content)
 
+        # Only the skeleton is validated, `$ref`s are resolved once a step is reached
         validate(instance=spec, schema=schema)
-        self.ctx.steps = spec["steps"]
-        self.env = NativeEnvironment()
-        self.env.filters["to_ctx"] = self.to_ctx
-        self.env.filters["to_results"] = self.to_results
+        self.ctx.document = spec
+        self.ctx.steps = list(spec["steps"])
+        self.ctx.scratch_nodes = {}
+        self.ctx.scratch_keys = []
 
         self.ctx.in_while = False
 
         if "setup" in spec:
-            for k in spec["setup"]:
+            for k in self.resolve_refs(spec["setup"]):
                 self.eval_template(k)
 
+    def load_uri(self, uri):
+        # Not persisted, referenced documents are loaded at most once per worker
+        try:
+            documents = self._documents
+        except AttributeError:
+            documents = self._documents = {}
+        if uri not in documents:
+            documents[uri] = my_fancy_loader(uri)
+        return documents[uri]
+
+    def resolve_refs(self, obj):
+        """Resolve the `$ref`s in a part of the specification, only loading what it references."""
+        document = jsonref.replace_refs({**self.ctx.document, "__resolve__": obj}, loader=self.load_uri)
+        return materialize(document["__resolve__"])
+
+    def current_step(self):
+        # Cached until the chain moves on, the context only holds the unresolved step
+        cached = getattr(self, "_current_step", None)
+        if cached is None or cached[0] != self.ctx.current_id:
+            self._current_step = (self.ctx.current_id, self.resolve_refs(self.ctx.steps[self.ctx.current_id]))
+        return self._current_step[1]
+
     def not_finished(self):
         return self.ctx.current_id < len(self.ctx.steps)
 
-    def submit_next(self):
-        n = self.next_step()
+    def load_instance_state(self, saved_state, load_context):
+        super().load_instance_state(saved_state, load_context)
+        # Timers are not persisted, re-arm the one of the running child if any
+        self.schedule_timeout()
 
-        if isinstance(n, Node):
-            self.ctx.current = n
+    def submit_next(self):
+        if self.chain_timed_out():
+            self.report("The walltime budget of the chain was exceeded")
+            return self.exit_codes.ERROR_TIMEOUT
+
+        if self.ctx.queued:
+            # Resolved when the chain was queued, so that the templates are only evaluated once
+            step = self.current_step()
+            cjob = self.get_process_class(step)
+            inputs = self.ctx.queued_inputs["inputs"]
+            priority = self.ctx.queued_inputs["priority"]
+        else:
+            n = self.next_step()
+
+            if isinstance(n, Node):
+                self.ctx.current = n
+                return None
+
+            if isinstance(n, ExitCode):
+                return n
+
+            cjob, inputs = n
+            if is_process_function(cjob):
+                store_nodes(inputs)
+                return ToContext(current=run_get_node(cjob, **inputs)[1])
+
+            step = self.current_step()
+            priority = int(self.eval_template(step.get("priority", self.inputs.priority.value)))
+
+        # Wait for a slot if the computer is capped, and ask again once any in-flight calcjob finished
+        computer = submission_queue.get_step_computer(inputs)
+        blockers = submission_queue.request_slot(self.node, computer, priority=priority)
+        self.ctx.queued = blockers is not None
+        if self.ctx.queued:
+            # Stored now to be kept in the checkpoint while waiting
+            store_nodes(inputs)
+            self.ctx.queued_inputs = {"inputs": inputs, "priority": priority}
+            self.report(f"Waiting for a free slot on computer {computer.label}, {len(blockers)} calcjobs in flight")
+            self.ctx.queue_blockers = []
+            for blocker in blockers:
+                self.to_context(queue_blockers=append_(blocker))
             return None
 
-        cjob, inputs = n
-        if is_process_function(cjob):
-            return ToContext(current=run_get_node(cjob, **inputs)[1])
-        return ToContext(current=self.submit(cjob, **inputs))
+        self.ctx.queued_inputs = None
+        store_nodes(inputs)
+        node = self.submit(cjob, **inputs)
+        self.arm_timeout(node, step)
+        return ToContext(current=node)
+
+    def is_queued(self):
+        return self.ctx.queued
+
+    def _on_awaitable_finished(self, awaitable):
+        # Waiting for a slot only needs one of the in-flight calcjobs to terminate
+        if not any(_ is awaitable for _ in self._awaitables):
+            # Already released along with another one
+            return
+        if awaitable.key == "queue_blockers":
+            for other in [_ for _ in self._awaitables if _.key == "queue_blockers" and _ is not awaitable]:
+                self._resolve_awaitable(other, None)
+        super()._on_awaitable_finished(awaitable)
+
+    # Walltime budgets
+    def chain_timed_out(self):
+        return "timeout" in self.inputs and time() >= self.ctx.start_time + self.inputs.timeout.value
+
+    def child_timed_out(self):
+        return self.ctx.timed_out or self.node.base.extras.get(TIMED_OUT_EXTRA, None) == self.ctx.current.pk
+
+    def arm_timeout(self, node, step):
+        deadlines = []
+        if "timeout" in step:
+            deadlines.append(time() + float(self.eval_template(step["timeout"])))
+        if "timeout" in self.inputs:
+            deadlines.append(self.ctx.start_time + self.inputs.timeout.value)
+
+        if deadlines:
+            self.ctx.timeout_child = {"pk": node.pk, "deadline": min(deadlines)}
+            self.schedule_timeout()
+
+    def schedule_timeout(self):
+        if self.ctx.get("timeout_child"):
+            pk, deadline = self.ctx.timeout_child["pk"], self.ctx.timeout_child["deadline"]
+            self._timeout_handle = self.loop.call_later(max(0, deadline - time()), self.on_timeout, pk)
+
+    def cancel_timeout(self):
+        handle = getattr(self, "_timeout_handle", None)
+        if handle is not None:
+            handle.cancel()
+            self._timeout_handle = None
+        self.ctx.timeout_child = None
+
+    def on_timeout(self, pk):
+        if not self.ctx.timeout_child or self.ctx.timeout_child["pk"] != pk or load_node(pk).is_terminated:
+            return
+
+        self.ctx.timed_out = True
+        # Not in a step, the context is only checkpointed by the next one
+        self.node.base.extras.set(TIMED_OUT_EXTRA, pk)
+        self.report(f"The walltime budget of subprocess <{pk}> was exceeded, killing it")
+        if self.runner.controller is None:
+            self.logger.info("no controller available to kill child<%s>", pk)
+            return
+        self.runner.controller.kill_process(pk, f"Walltime budget exceeded, killed by parent<{self.node.pk}>")
 
     def next_step(self):
 
@@ -336,25 +610,31 @@ class DeclarativeChain(WorkChain):
             return load_node(step["node"])
 
         if any(_ in step for _ in ("calcjob", "workflow", "calculation", "calcfunction")):
-            # This needs to happen because no dict 2 node for now.
-            # M inputs = dict()
-            if "calcjob" in step:
-                cjob = CalculationFactory(step["calcjob"])
-            elif "calcfunction" in step:
-                cjob = CalculationFactory(step["calcfunction"])
-            elif "calculation" in step:
-                cjob = CalculationFactory(step["calculation"])
-            elif "workflow" in step:
-                cjob = WorkflowFactory(step["workflow"])
-            else:
-                raise ValueError(f"Unrecognized step {step}")
-
+            step = self.current_step()
+            cjob = self.get_process_class(step)
             spec_inputs = cjob.spec().inputs
             inputs = self.resolve_inputs(step["inputs"], spec_inputs)
+            if issubclass(cjob, CalcJob):
+                exit_code = self.apply_remote_affinity(step, inputs, spec_inputs)
+                if exit_code is not None:
+                    return exit_code
             return cjob, inputs
 
         raise ValueError(f"Unrecognized step {step}")
 
+    def get_process_class(self, step):
+        # This needs to happen because no dict 2 node for now.
+        # M inputs = dict()
+        if "calcjob" in step:
+            return CalculationFactory(step["calcjob"])
+        if "calcfunction" in step:
+            return CalculationFactory(step["calcfunction"])
+        if "calculation" in step:
+            return CalculationFactory(step["calculation"])
+        if "workflow" in step:
+            return WorkflowFactory(step["workflow"])
+        raise ValueError(f"Unrecognized step {step}")
+
     def resolve_inputs(self, inputs, spec_inputs):
         out = {}
         for k in inputs:
@@ -368,11 +648,28 @@ class DeclarativeChain(WorkChain):
                 valid_type = i.valid_type
 
                 if valid_type is None:
+                    # Namespaces such as `metadata` are passed on as they are
                     set_dot2index(
-                        out, k, orm.to_aiida_type(val) if not (isinstance(val, orm.Data) or k == "metadata") else val
+                        out,
+                        k,
+                        (
+                            orm.to_aiida_type(val)
+                            if not (isinstance(val, orm.Data) or isinstance(i, plumpy.PortNamespace))
+                            else val
+                        ),
                     )
                     continue
 
+                if (
+                    isinstance(i, plumpy.PortNamespace)
+                    and isinstance(val, dict)
+                    and val
+                    and all(_ in i and i[_].valid_type is None for _ in val)
+                ):
+                    # Only namespaces, e.g. an exposed `metadata`, of a dynamic namespace are given
+                    set_dot2index(out, k, val)
+                    continue
+
                 if isinstance(val, valid_type):
                     set_dot2index(out, k, val)
                     continue
@@ -402,6 +699,44 @@ class DeclarativeChain(WorkChain):
 
         return out
 
+    def apply_remote_affinity(self, step, inputs, spec_inputs):
+        """Run calcjobs with a RemoteData input on the computer of that RemoteData.
+
+        AiiDA cannot copy remote data between computers, so the `ERROR_REMOTE_COMPUTER`
+        exit code is returned if that is not possible.
+        """
+        remotes = find_remote_data(inputs)
+        if not remotes:
+            return None
+
+        computer = remotes[0].computer
+        if any(remote.computer.pk != computer.pk for remote in remotes):
+            labels = sorted({remote.computer.label for remote in remotes})
+            self.report(f"RemoteData inputs are on different computers: {', '.join(labels)}")
+            return self.exit_codes.ERROR_REMOTE_COMPUTER
+
+        code = inputs.get("code")
+        if code is None:
+            set_dot2index(inputs, "metadata.computer", computer)
+        elif code.computer.pk != computer.pk:
+            # Restrict the equivalent codes to the ones on the computer of the RemoteData
+            candidates = self.resolve_input(step["inputs"]["code"])
+            candidates = [load_code(_) for _ in candidates] if isinstance(candidates, list) else []
+            candidates = [_ for _ in candidates if _.computer.pk == computer.pk]
+            if not candidates:
+                self.report(f"No code on computer {computer.label} of the RemoteData inputs")
+                return self.exit_codes.ERROR_REMOTE_COMPUTER
+            inputs["code"] = submission_queue.select_code(candidates)
+
+        if step.get("symlink_parent", False):
+            # Convention of e.g. aiida-quantumespresso to symlink instead of copy the parent folder
+            if "settings" not in spec_inputs:
+                self.report(f"{step.get('calcjob', step.get('calculation'))} has no settings to symlink the parent")
+            else:
+                settings = inputs["settings"].get_dict() if "settings" in inputs else {}
+                inputs["settings"] = Dict({**settings, "PARENT_FOLDER_SYMLINK": True})
+        return None
+
     def resolve_input(self, input):
         if isinstance(input, dict):
             # If 'value' and 'type' are in dict we assume lowest level, otherwise recurse
@@ -412,10 +747,8 @@ class DeclarativeChain(WorkChain):
                     valid_type = ast.literal_eval(input["type"])  # Other classes
 
                 return dict2datanode(self.resolve_input(input["value"]), valid_type)
-            # Normal dict, recurse
-            for k in input:
-                input[k] = self.resolve_input(input[k])
-            return input
+            # Normal dict, recurse without modifying the step itself
+            return {k: self.resolve_input(v) for k, v in input.items()}
 
         if isinstance(input, list):
             list_s = []
@@ -427,35 +760,80 @@ class DeclarativeChain(WorkChain):
         return self.eval_template(input)
 
     def process_current(self):
-        step = self.ctx.steps[self.ctx.current_id]
+        step = self.current_step()
+
+        self.cancel_timeout()
+        if self.child_timed_out():
+            self.ctx.timed_out = False
+            if TIMED_OUT_EXTRA in self.node.base.extras:
+                self.node.base.extras.delete(TIMED_OUT_EXTRA)
+            if "on_timeout" in step and not self.chain_timed_out():
+                for k in step["on_timeout"]:
+                    self.eval_template(k)
+                return self.next_id()
+
+            if "error" in step:
+                return self.error_exit_code(step)
+            return self.exit_codes.ERROR_TIMEOUT
 
         if not self.ctx.current.is_finished_ok:
             self.report(
                 f"A subprocess failed with exit status {self.ctx.current.exit_status}: {self.ctx.current.exit_message}"
             )
             if "error" in step:
-                validate(step["error"], schema=ExitCode_schema)
-                return (
-                    ExitCode(step["error"]["code"])
-                    if "message" not in step["error"]
-                    else ExitCode(step["error"]["code"], message=step["error"]["message"])
-                )
+                return self.error_exit_code(step)
 
         if "postprocess" in step:
             for k in step["postprocess"]:
                 self.eval_template(k)
 
+        return self.next_id()
+
+    def next_id(self):
+        self._current_step = None
         self.ctx.current_id += 1
 
         if self.ctx.in_while and self.ctx.current_id == len(self.ctx.steps):
             self.ctx.current_id = self.ctx.while_entry_id
 
-        return None
+    def error_exit_code(self, step):
+        validate(step["error"], schema=ExitCode_schema)
+        return (
+            ExitCode(step["error"]["code"])
+            if "message" not in step["error"]
+            else ExitCode(step["error"]["code"], message=step["error"]["message"])
+        )
 
     # Jinja evaluation
+    @property
+    def env(self):
+        # Not persisted in the checkpoint, so (re)create it on first use in this worker
+        try:
+            return self._env
+        except AttributeError:
+            self._env = NativeEnvironment()
+            self._env.filters["to_ctx"] = self.to_ctx
+            self._env.filters["to_results"] = self.to_results
+            self._env.filters["to_scratch"] = self.to_scratch
+            return self._env
+
+    @property
+    def scratch(self):
+        """Values that only live in worker memory and are never checkpointed.
+
+        After a restart only stored nodes survive, they are reloaded from their pk. Reading
+        any other value raises a `ValueError` until it is set again.
+        """
+        try:
+            return self._scratch
+        except AttributeError:
+            nodes = {k: load_node(pk) for k, pk in self.ctx.get("scratch_nodes", {}).items()}
+            self._scratch = Scratch(nodes, lost=set(self.ctx.get("scratch_keys", [])) - nodes.keys())
+            return self._scratch
+
     def eval_template(self, s):
         if isinstance(s, str) and "{{" in s and "}}" in s:
-            return self.env.from_string(s).render(ctx=self.ctx)
+            return self.env.from_string(s).render(ctx=self.ctx, scratch=self.scratch)
         return s
 
     # Jinja Filters
@@ -467,5 +845,15 @@ class DeclarativeChain(WorkChain):
         self.ctx.results[key] = value
         return value
 
+    def to_scratch(self, value, key):
+        self.scratch[key] = value
+        if key not in self.ctx.scratch_keys:
+            self.ctx.scratch_keys.append(key)
+        if isinstance(value, Node) and value.is_stored:
+            self.ctx.scratch_nodes[key] = value.pk
+        else:
+            self.ctx.scratch_nodes.pop(key, None)
+        return value
+
     def finalize(self):
         self.out("results", self.ctx.results)
@@ -1,19 +1,327 @@
 from __future__ import annotations
 
+from collections import OrderedDict
+from collections.abc import Mapping
+from hashlib import sha256
 from io import StringIO
+import json
+from pathlib import Path
+import re
+import shlex
+import sys
+from tempfile import TemporaryDirectory
 
+from aiida.common.exceptions import NotExistent
 from aiida.engine import ToContext, WorkChain, calcfunction
-from aiida.orm import Dict, SinglefileData, Str
+from aiida.orm import (
+    ArrayData,
+    Bool,
+    CalcFunctionNode,
+    Dict,
+    Int,
+    List,
+    QueryBuilder,
+    RemoteData,
+    SinglefileData,
+    Str,
+    load_code,
+    load_computer,
+)
+from aiida.schedulers.datastructures import NodeNumberJobResource
 from aiida_shell import ShellJob
 from aiida_shell.launch import prepare_code
 import chevron
+from chevron.tokenizer import tokenize
+import numpy as np
+
+from execflow.utils import submission_queue, warm_pool
+from execflow.utils.staging import stage_file
+
+# Worker-wide cache of the prepared codes: (command, computer pk) -> code pk
+CODES: dict[tuple[str, int | None], int] = {}
+
+
+def get_code(command, computer=None):
+    key = (command, None if computer is None else computer.pk)
+    if key in CODES:
+        try:
+            code = load_code(CODES[key])
+        except NotExistent:
+            code = None
+        if code is not None and code.label == command and key[1] in (None, code.computer.pk):
+            return code
+        del CODES[key]
+
+    code = prepare_code(command, computer)
+    CODES[key] = code.pk
+    return code
+
+
+# Extra holding the hash of the template and parameters a file was rendered from
+TEMPLATE_HASH_EXTRA = "execflow_template_hash"
+
+
+# Number of tokenized templates cached per worker
+TEMPLATE_CACHE_SIZE = 32
+
+# Worker-wide cache of the tokenized templates: sha256 of the template -> tokens
+TEMPLATES: OrderedDict[str, list[tuple[str, str]]] = OrderedDict()
+
+
+def compile_template(content):
+    key = sha256(content.encode()).hexdigest()
+    if key in TEMPLATES:
+        TEMPLATES.move_to_end(key)
+        return TEMPLATES[key]
+
+    TEMPLATES[key] = list(tokenize(content))
+    while len(TEMPLATES) > TEMPLATE_CACHE_SIZE:
+        TEMPLATES.popitem(last=False)
+    return TEMPLATES[key]
+
+
+def render_tokens(tokens, data, handle):
+    """Render tokenized mustache template to a file handle.
+
+    Every top-level literal, variable or complete section is rendered by chevron and
+    written out on its own, so the rendered file is never held in memory as a whole.
+    """
+    chunk = []
+    depth = 0
+    for tag, key in tokens:
+        chunk.append((tag, key))
+        if tag in ("section", "inverted section"):
+            depth += 1
+        elif tag == "end":
+            depth -= 1
+
+        if depth == 0:
+            handle.write(chevron.render(chunk, data))
+            chunk = []
 
 
 @calcfunction
 def fill_template(template: SinglefileData, parameters: Dict):
-    content = template.get_content()
-    out = chevron.render(content, parameters.get_dict())
-    return SinglefileData(StringIO(out))
+    tokens = compile_template(template.get_content())
+    with TemporaryDirectory() as directory:
+        path = Path(directory) / SinglefileData.DEFAULT_FILENAME
+        with path.open("w") as handle:
+            render_tokens(tokens, parameters.get_dict(), handle)
+        return SinglefileData(path)
+
+
+def render_template(template, parameters):
+    """Render a template, reusing a stored rendering of the same template content and parameters."""
+    template = SinglefileData(template)
+    parameters = parameters if isinstance(parameters, Dict) else Dict(dict(parameters))
+    try:
+        serialized = json.dumps(parameters.get_dict(), sort_keys=True)
+    except TypeError:
+        # Parameters that cannot be serialized cannot be looked up either
+        return fill_template(template, parameters)
+    key = sha256(f"{template.base.repository.hash()}:{serialized}".encode()).hexdigest()
+
+    # Only renderings created by `fill_template` are trusted, not any node carrying the extra
+    process_type = fill_template.process_class.build_process_type()
+    query = QueryBuilder().append(CalcFunctionNode, filters={"process_type": process_type}, tag="fill")
+    query.append(SinglefileData, with_incoming="fill", filters={f"extras.{TEMPLATE_HASH_EXTRA}": key})
+    rendered = query.first(flat=True)
+    if rendered is None:
+        rendered = fill_template(template, parameters)
+        rendered.base.extras.set(TEMPLATE_HASH_EXTRA, key)
+    return rendered
+
+
+# Working subdirectory of each item of a batch
+BATCH_DIR = "batch_{}"
+
+SCRIPT = """#!/bin/bash
+{command}
+"""
+
+BATCH_SCRIPT = """#!/bin/bash
+run_item() {{
+    cd "$1" || return 1
+    {{ {command}; }} > stdout 2> stderr
+    status=$?
+    echo $status > status
+    return $status
+}}
+export -f run_item
+printf '%s\\n' {directories} | xargs -P {parallel} -I {{}} bash -c 'run_item {{}}'
+"""
+
+
+# Globs of a retrieval policy, expanded by bash
+GLOB = re.compile(r"[\w.*?/\[\]!-]+")
+
+# Subdirectory of the working directory holding the files that are not retrieved
+REMOTE_DIR = "_remote"
+
+RETRIEVE_KEYS = ("include", "exclude", "max_size", "tail", "keep_remote")
+
+STREAMS_SCRIPT = """{{ {command}; }} > stdout_full 2> stderr_full
+status=$?
+"""
+
+MAX_SIZE_STREAM_SCRIPT = """{select} {stream}_full > {stream}_retrieved
+if [ "$(wc -c < {stream}_retrieved)" -le {max_size} ]; then cat {stream}_retrieved{redirect}; fi
+rm -f {stream}_retrieved
+"""
+
+BATCH_TAIL_SCRIPT = """for output in {outputs}; do
+    mv "$output" "$output"_full && tail -n {tail} "$output"_full > "$output"
+done
+"""
+
+EXCLUDE_SCRIPT = """mkdir -p {remote}
+for path in {exclude}; do
+    [ -e "$path" ] || continue
+    mkdir -p "{remote}/$(dirname "$path")" && mv "$path" "{remote}/$path"
+done
+"""
+
+MAX_SIZE_SCRIPT = """find {include} -type f -size +{max_size}c 2> /dev/null | while read -r path; do
+    mkdir -p "{remote}/$(dirname "$path")" && mv "$path" "{remote}/$path"
+done
+"""
+
+
+def to_dict(value):
+    if isinstance(value, Mapping):
+        return {k: to_dict(v) for k, v in value.items()}
+    return value
+
+
+def get_batch_size(files):
+    """Return the number of items if any file is given a list of parameter sets, else `None`."""
+    sizes = {len(f["parameters"]) for f in files.values() if isinstance(f.get("parameters"), (list, tuple))}
+    if len(sizes) > 1:
+        raise ValueError(f"All lists of parameters of a batch must have the same length, got {sorted(sizes)}")
+    return sizes.pop() if sizes else None
+
+
+def get_command_line(commands, filenames):
+    """Return a shell command line running the commands back-to-back.
+
+    The line stops at the first failing command. The stdout of every command but the
+    last one is written to `stdout_<i>` in the working directory.
+    """
+    lines = []
+    for i, command in enumerate(commands):
+        arguments = list(command.get("arguments", []))
+        for k, filename in filenames.items():
+            arguments = [argument.replace(f"{{{k}}}", filename) for argument in arguments]
+        line = shlex.join([command["command"], *arguments])
+        lines.append(line if i == len(commands) - 1 else f"{line} > stdout_{i}")
+    return " && ".join(lines)
+
+
+def get_retrieval_script(script, retrieve, include, size=None):
+    """Return a bash script applying a retrieval policy once the command of a script has run.
+
+    Files that are excluded, larger than `max_size` or the full stdout and stderr when
+    only their tail or up to `max_size` of them is retrieved, are moved to `REMOTE_DIR`,
+    which is removed unless `keep_remote` is set. The script exits with the exit status
+    of the command.
+    """
+    exclude = list(retrieve.get("exclude", []))
+    if size is None and ("tail" in retrieve or "max_size" in retrieve):
+        # The stdout and stderr of the script are retrieved, only write what is retrieved of them there
+        header, command_line = script.rstrip("\n").rsplit("\n", 1)
+        script = f"{header}\n" + STREAMS_SCRIPT.format(command=command_line)
+        select = f"tail -n {retrieve['tail']}" if "tail" in retrieve else "cat"
+        for stream, redirect in (("stdout", ""), ("stderr", " >&2")):
+            if "max_size" in retrieve:
+                script += MAX_SIZE_STREAM_SCRIPT.format(
+                    select=select, stream=stream, max_size=retrieve["max_size"], redirect=redirect
+                )
+            else:
+                script += f"{select} {stream}_full{redirect}\n"
+        exclude += ["stdout_full", "stderr_full"]
+    elif "tail" in retrieve:
+        outputs = " ".join(f"{BATCH_DIR.format(i)}/{_}" for i in range(size) for _ in ("stdout", "stderr"))
+        script += f"status=$?\n{BATCH_TAIL_SCRIPT.format(outputs=outputs, tail=retrieve['tail'])}"
+        exclude += [BATCH_DIR.format("*") + "/stdout_full", BATCH_DIR.format("*") + "/stderr_full"]
+    else:
+        script += "status=$?\n"
+
+    script += EXCLUDE_SCRIPT.format(remote=REMOTE_DIR, exclude=" ".join(exclude))
+    if "max_size" in retrieve and include:
+        script += MAX_SIZE_SCRIPT.format(remote=REMOTE_DIR, include=" ".join(include), max_size=retrieve["max_size"])
+    if not retrieve.get("keep_remote", False):
+        script += f"rm -rf {REMOTE_DIR}\n"
+    return script + "exit $status\n"
+
+
+def as_glob(path):
+    """Return a glob matching only `path`.
+
+    The `ShellJob` reports outputs given by name missing when they are not retrieved, but
+    not the globs that match nothing.
+    """
+    path = path.rstrip("/")
+    if "*" in path:
+        return path
+    # A `]` right after the `[` is taken literally, anywhere else it closes the set
+    return f"{path[:-1]}[]*]" if path[-1] == "]" else f"{path[:-1]}[*{path[-1]}]"
+
+
+@calcfunction
+def get_remote_outputs(remote_folder: RemoteData):
+    """Return a reference to the outputs that were left on the computer by a retrieval policy."""
+    return RemoteData(computer=remote_folder.computer, remote_path=f"{remote_folder.get_remote_path()}/{REMOTE_DIR}")
+
+
+PARSER_KEYS = ("dtype", "columns", "delimiter", "skiprows", "comments")
+
+
+@calcfunction
+def parse_array(file: SinglefileData, parser: Dict):
+    """Parse a tabular or numeric file into an `ArrayData` in bulk.
+
+    The file is read with `numpy.loadtxt`, as `dtype` (`float64` by default). `columns`
+    is either a list of the indices of the columns to read, stored as the 2D `data`
+    array, or a mapping of array names to column indices, each stored as a 1D array.
+    """
+    parser = parser.get_dict()
+    columns = parser.get("columns")
+    usecols = list(columns.values()) if isinstance(columns, dict) else columns
+    with file.open() as handle:
+        data = np.loadtxt(
+            handle,
+            dtype=parser.get("dtype", "float64"),
+            delimiter=parser.get("delimiter"),
+            skiprows=parser.get("skiprows", 0),
+            comments=parser.get("comments", "#"),
+            usecols=usecols,
+            ndmin=2,
+        )
+
+    array = ArrayData()
+    if isinstance(columns, dict):
+        for i, name in enumerate(columns):
+            array.set_array(name, data[:, i])
+    else:
+        array.set_array("data", data)
+    return array
+
+
+def get_warm_command(command):
+    """Return a command running a Python module by its warm pool on the local computer."""
+    return {
+        "command": sys.executable,
+        "arguments": [str(warm_pool.SCRIPT), command["command"], *command.get("arguments", [])],
+    }
+
+
+def get_batch_script(command_line, size, parallel):
+    """Return a bash script running a command line for each item of a batch in its own subdirectory."""
+    return BATCH_SCRIPT.format(
+        command=command_line,
+        directories=" ".join(BATCH_DIR.format(i) for i in range(size)),
+        parallel=parallel,
+    )
 
 
 class ExecWrapper(WorkChain):
@@ -23,28 +331,151 @@ class ExecWrapper(WorkChain):
         super().define(spec)
 
         spec.input("files", valid_type=(Dict, dict), is_metadata=True)
-        spec.input("command", valid_type=Str)
+        spec.input("command", valid_type=Str, required=False)
+        spec.input(
+            "commands",
+            valid_type=List,
+            required=False,
+            help="Commands run back-to-back in the same working directory, each a dict with a 'command' and "
+            "optionally 'arguments'. Replaces `command` and `arguments`.",
+        )
+        spec.input(
+            "computers",
+            valid_type=List,
+            required=False,
+            help="Labels of equivalent computers, the command is run on the least loaded one. Replaces "
+            "`shelljob.metadata.computer`.",
+        )
+        spec.input(
+            "parallel",
+            valid_type=Int,
+            default=lambda: Int(1),
+            help="Number of items of a batch that are run at the same time.",
+        )
+        spec.input(
+            "retrieve",
+            valid_type=Dict,
+            required=False,
+            help="Retrieval policy: globs of the files to `include` and `exclude`, the `max_size` in bytes of the "
+            "retrieved files, the number of lines of stdout and stderr to retrieve (`tail`), and whether to "
+            "`keep_remote` the files that are not retrieved, exposed as the `remote_outputs` output.",
+        )
+        spec.input(
+            "warm",
+            valid_type=Bool,
+            default=lambda: Bool(False),
+            help="Run the commands, names of Python modules, by a warm pool of the local computer that imports "
+            "each module once.",
+        )
+        spec.input(
+            "parsers",
+            valid_type=Dict,
+            required=False,
+            help="Mapping of output names to the `dtype`, `columns`, `delimiter`, `skiprows` and `comments` of their "
+            "content, parsed into the `arrays` outputs.",
+        )
         spec.expose_inputs(ShellJob, exclude=["nodes", "filenames", "code", "metadata"])
         spec.expose_inputs(ShellJob, include=["metadata"], namespace="shelljob")
 
-        spec.outline(cls.setup, cls.register_code, cls.submit_shell, cls.finalize)
+        spec.inputs.validator = cls.validate_inputs
+        spec.outline(cls.setup, cls.register_code, cls.stage_files, cls.submit_shell, cls.finalize)
 
         spec.outputs.dynamic = True
+        spec.output_namespace("arrays", valid_type=ArrayData, required=False, dynamic=True)
+
+        spec.exit_code(300, "ERROR_WARM_POOL_NOT_LOCAL", message="Warm pools only run on the local computer.")
+
+    @staticmethod
+    def validate_inputs(value, _):
+        if ("command" in value) == ("commands" in value):
+            return "Exactly one of `command` and `commands` has to be specified."
+        if "commands" in value and "arguments" in value:
+            return "`arguments` cannot be used with `commands`, give the arguments of each command instead."
+        if "computers" in value and value.get("shelljob", {}).get("metadata", {}).get("computer") is not None:
+            return "`shelljob.metadata.computer` cannot be used with `computers`."
+        if value.get("shelljob", {}).get("metadata", {}).get("options", {}).get("withmpi", False):
+            batch = any(isinstance(f.get("parameters"), (list, tuple)) for f in value["files"].values())
+            if batch or "commands" in value or "retrieve" in value:
+                # The driving bash script would be launched once per process
+                return "`withmpi` cannot be used with `commands`, `retrieve` or batches, only with a single `command`."
+        if "retrieve" in value:
+            retrieve = value["retrieve"].get_dict()
+            unknown = set(retrieve) - set(RETRIEVE_KEYS)
+            if unknown:
+                return f"Unknown keys {sorted(unknown)} in `retrieve`, valid keys are {list(RETRIEVE_KEYS)}."
+            globs = [*retrieve.get("include", []), *retrieve.get("exclude", [])]
+            if any(not GLOB.fullmatch(glob) for glob in globs):
+                return f"Invalid globs in `retrieve`: {globs}, only paths without spaces or quotes are supported."
+        if "parsers" in value:
+            for name, parser in value["parsers"].items():
+                unknown = set(parser) - set(PARSER_KEYS)
+                if unknown:
+                    return f"Unknown keys {sorted(unknown)} in the parser of `{name}`, valid: {list(PARSER_KEYS)}."
+        return None
 
     def setup(self):
 
         self.ctx.filenodes = {}
         self.ctx.filenames = {}
+        self.ctx.batch_size = get_batch_size(self.inputs.files)
+        if self.ctx.batch_size is not None:
+            return self.setup_batch()
+
         for k, f in self.inputs.files.items():
             if "node" in f:
                 self.ctx.filenodes[k] = f["node"]
             else:
-                self.ctx.filenodes[k] = fill_template(SinglefileData(f["template"]), f.get("parameters", Dict()))
+                self.ctx.filenodes[k] = render_template(f["template"], f.get("parameters", {}))
             self.ctx.filenames[k] = f["filename"]
+        return None
+
+    def setup_batch(self):
+        # Every item gets its own copy of all files in its own subdirectory
+        for i in range(self.ctx.batch_size):
+            for k, f in self.inputs.files.items():
+                if "node" in f:
+                    self.ctx.filenodes[f"{k}_{i}"] = f["node"]
+                else:
+                    parameters = f.get("parameters", {})
+                    if isinstance(parameters, (list, tuple)):
+                        parameters = parameters[i]
+                    self.ctx.filenodes[f"{k}_{i}"] = render_template(f["template"], parameters)
+                self.ctx.filenames[f"{k}_{i}"] = f"{BATCH_DIR.format(i)}/{f['filename']}"
 
     def register_code(self):
-        computer = (self.inputs.shelljob.metadata or {}).get("options", {}).get("computer", None)
-        self.ctx.code = prepare_code(str(self.inputs.command.value), computer)
+        if "computers" in self.inputs:
+            # Several equivalent computers, run on the least loaded one
+            computer = submission_queue.select_computer([load_computer(_) for _ in self.inputs.computers.get_list()])
+        else:
+            computer = (self.inputs.shelljob.metadata or {}).get("computer", None)
+        if self.inputs.warm and computer is not None and computer.transport_type != "core.local":
+            return self.exit_codes.ERROR_WARM_POOL_NOT_LOCAL
+
+        # Batches and sequences of commands are driven by a bash script
+        if self.uses_script():
+            command = "bash"
+        elif self.inputs.warm:
+            command = sys.executable
+        else:
+            command = str(self.inputs.command.value)
+        self.ctx.code = get_code(command, computer)
+        return None
+
+    def stage_files(self):
+        """Replace the files marked with `stage` by their copy in the staging directory of the computer."""
+        self.ctx.staged = []
+        for k, f in self.inputs.files.items():
+            if not f.get("stage", False):
+                continue
+            if self.ctx.batch_size is not None:
+                # The staged files are linked into the top of the working directory only
+                self.report(f"Staging is not supported in batch mode, `{k}` is uploaded with every item.")
+                continue
+            self.ctx.filenodes[k] = stage_file(self.ctx.filenodes[k], self.ctx.filenames[k], self.ctx.code.computer)
+            self.ctx.staged.append(k)
+
+    def uses_script(self):
+        return self.ctx.batch_size is not None or "commands" in self.inputs or "retrieve" in self.inputs
 
     def submit_shell(self):
         inputs = {
@@ -54,15 +485,85 @@ class ExecWrapper(WorkChain):
             **self.exposed_inputs(ShellJob),
         }
 
-        # if 'metadata' in self.inputs.shelljob:
-        #    inputs['metadata'] =  self.inputs.shelljob.metadata
-        # else:
-        # This if else from Louis did not work.
-        inputs["metadata"] = {"options": {"resources": {"num_machines": 1, "num_mpiprocs_per_machine": 1}}}
+        inputs["metadata"] = self.get_shelljob_metadata()
+
+        if self.ctx.staged:
+            inputs["metadata"]["options"]["use_symlinks"] = True
+            if "arguments" in inputs and not self.uses_script():
+                # ShellJob does not substitute the placeholders of remote nodes
+                arguments = inputs["arguments"].get_list()
+                for k in self.ctx.staged:
+                    arguments = [argument.replace(f"{{{k}}}", self.ctx.filenames[k]) for argument in arguments]
+                inputs["arguments"] = arguments
+
+        if self.inputs.warm and not self.uses_script():
+            arguments = inputs.get("arguments", [])
+            arguments = arguments.get_list() if isinstance(arguments, List) else list(arguments)
+            inputs["arguments"] = get_warm_command({"command": self.inputs.command.value, "arguments": arguments})[
+                "arguments"
+            ]
+
+        if self.uses_script():
+            if "commands" in self.inputs:
+                commands = self.inputs.commands.get_list()
+            else:
+                arguments = inputs.pop("arguments", None)
+                commands = [
+                    {"command": self.inputs.command.value, "arguments": arguments.get_list() if arguments else []}
+                ]
+            if self.inputs.warm:
+                commands = [get_warm_command(command) for command in commands]
+            command_line = get_command_line(commands, {k: f["filename"] for k, f in self.inputs.files.items()})
+
+            if self.ctx.batch_size is not None:
+                script = get_batch_script(command_line, self.ctx.batch_size, self.inputs.parallel.value)
+                inputs["outputs"] = [BATCH_DIR.format("*")]
+            else:
+                script = SCRIPT.format(command=command_line)
+
+            if "retrieve" in self.inputs:
+                retrieve = self.inputs.retrieve.get_dict()
+                outputs = inputs.get("outputs", [])
+                outputs = outputs.get_list() if isinstance(outputs, List) else list(outputs)
+                outputs += retrieve.get("include", [])
+                if outputs:
+                    # Outputs that are excluded or too large are not retrieved, without failing the job
+                    inputs["outputs"] = [as_glob(_) for _ in outputs]
+                script = get_retrieval_script(script, retrieve, outputs, self.ctx.batch_size)
+
+            inputs["nodes"] = {**self.ctx.filenodes, "script": SinglefileData(StringIO(script))}
+            inputs["filenames"] = {**self.ctx.filenames, "script": "run.sh"}
+            inputs["arguments"] = ["{script}"]
 
         shell = self.submit(ShellJob, **inputs)
         return ToContext(shell=shell)  # nosec
 
+    def get_shelljob_metadata(self):
+        """Return the metadata of the ShellJob, defaulting to a single process when no resources are given.
+
+        The default only applies to schedulers whose resources are a number of machines; the resources of other
+        schedulers, e.g. the parallel environment of SGE, have no sensible default and are passed on as given.
+        """
+        metadata = to_dict(self.exposed_inputs(ShellJob, namespace="shelljob").get("metadata", {}))
+        options = metadata.setdefault("options", {})
+
+        resources = options.setdefault("resources", {})
+        if not issubclass(self.ctx.code.computer.get_scheduler().job_resource_class, NodeNumberJobResource):
+            return metadata
+        resources.setdefault("num_machines", 1)
+        if "tot_num_mpiprocs" not in resources and not self.ctx.code.computer.get_default_mpiprocs_per_machine():
+            resources.setdefault("num_mpiprocs_per_machine", 1)
+        return metadata
+
     def finalize(self):
         for k in self.ctx.shell.outputs:
             self.out(f"{k}", self.ctx.shell.outputs[k])
+
+        if "retrieve" in self.inputs and self.inputs.retrieve.get_dict().get("keep_remote", False):
+            self.out("remote_outputs", get_remote_outputs(self.ctx.shell.outputs.remote_folder))
+
+        for k, parser in self.inputs.get("parsers", {}).items():
+            if k not in self.ctx.shell.outputs:
+                self.report(f"No output `{k}` to parse.")
+                continue
+            self.out(f"arrays.{k}", parse_array(self.ctx.shell.outputs[k], Dict(parser)))
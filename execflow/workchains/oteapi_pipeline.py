@@ -6,13 +6,16 @@ from typing import TYPE_CHECKING
 
 from aiida import orm
 from aiida.common.exceptions import InputValidationError, ValidationError
-from aiida.engine import run, run_get_node, while_
+from aiida.engine import if_, run, run_get_node, while_
 from aiida.engine.processes.workchains.workchain import WorkChain
 from aiida.plugins import CalculationFactory, WorkflowFactory
 
 from execflow.data.oteapi.declarative_pipeline import OTEPipelineData
+from execflow.oteapi_strategies.registry import close_pool, open_pool
+from execflow.oteapi_strategies.transformation import GetTransformation
 
 if TYPE_CHECKING:  # pragma: no cover
+    from aiida.engine import ExitCode
     from aiida.engine.processes.workchains.workchain import WorkChainSpec
 
 
@@ -29,6 +32,11 @@ class OTEPipeline(WorkChain):
         - **run_pipeline** (:py:class:`aiida.orm.Str`) -- The pipeline to run.
           The pipeline name should match a pipeline given in the declarative pipeline
           given in the `pipeline` input.
+        - **fused** (:py:class:`aiida.orm.Bool`) -- Whether to run all strategies in a
+          single process, storing only the final session. Defaults to `False`.
+        - **transformation** -- The `walltime`, `interval` and `max_interval` of the
+          checks of the status of transformations, see
+          :py:class:`~execflow.oteapi_strategies.transformation.GetTransformation`.
 
     Outputs:
         - **session** (:py:class:`aiida.orm.Dict`) -- The OTE session object after
@@ -36,7 +44,11 @@ class OTEPipeline(WorkChain):
 
     Outline:
         - :py:meth:`~execflow.workchains.oteapi_pipeline.OTEPipeline.setup`
-        - while
+        - if :py:meth:`~execflow.workchains.oteapi_pipeline.OTEPipeline.is_fused`:
+
+          - :py:meth:`~execflow.workchains.oteapi_pipeline.OTEPipeline.run_fused`
+
+        - else while
           :py:meth:`~execflow.workchains.oteapi_pipeline.OTEPipeline.not_finished`:
 
           - :py:meth:`~execflow.workchains.oteapi_pipeline.OTEPipeline.submit_next`
@@ -60,6 +72,10 @@ class OTEPipeline(WorkChain):
             required=True,
         )
         spec.input("run_pipeline", valid_type=orm.Str, required=False)
+        spec.input("fused", valid_type=orm.Bool, default=lambda: orm.Bool(False))
+        spec.expose_inputs(
+            GetTransformation, namespace="transformation", include=["walltime", "interval", "max_interval"]
+        )
         spec.inputs.dynamic = True
         spec.outputs.dynamic = True
         # Outputs
@@ -69,7 +85,9 @@ class OTEPipeline(WorkChain):
         spec.outline(
             cls.parse_pipeline,
             cls.setup,
-            while_(cls.not_finished)(cls.submit_next, cls.process_current),
+            if_(cls.is_fused)(cls.run_fused).else_(
+                while_(cls.not_finished)(cls.submit_next, cls.process_current),
+            ),
             cls.finalize,
         )
 
@@ -94,9 +112,12 @@ class OTEPipeline(WorkChain):
         - Parse declarative pipeline.
         - Create a list of strategies to run, explicitly adding `init` and `get`
           CalcFunctions.
+        - Open the pool of strategy instances shared by the `init` and `get` of each
+          strategy.
 
         """
         self.ctx.current_id = 0
+        open_pool(self.node.uuid)
         pipeline: OTEPipelineData = self.ctx.pipeline
 
         # Outline pipeline
@@ -143,9 +164,39 @@ class OTEPipeline(WorkChain):
         self.ctx.ote_session = orm.Dict()
         # Add all the input nodes to ote_session
         for k in self.inputs:
-            if isinstance(self.inputs[k], orm.Data):
+            if k != "fused" and isinstance(self.inputs[k], orm.Data):
                 self.ctx.ote_session[k] = self.inputs[k].pk
 
+    def is_fused(self) -> bool:
+        """Whether or not to run all strategies in a single process."""
+        return self.inputs.fused.value
+
+    def run_fused(self) -> ExitCode | None:
+        """Run all strategies in a single process.
+
+        The configurations are passed once, even if used by both the `init` and `get`
+        of a strategy. The `get` of transformations blocks the process, with the
+        `transformation` inputs.
+
+        """
+        strategies = []
+        configs = {}
+        for strategy_method, strategy_type, strategy_config in self.ctx.strategies:
+            key = f"config_{strategy_config.pk}"
+            configs[key] = strategy_config
+            strategies.append((strategy_method, strategy_type, key))
+
+        self.ctx.current = run_get_node(
+            WorkflowFactory("execflow.fused_pipeline"),
+            strategies=orm.List(strategies),
+            session=self.ctx.ote_session,
+            **self.exposed_inputs(GetTransformation, namespace="transformation"),
+            **configs,
+        )[1]
+        exit_code = self.process_current()
+        self.ctx.current_id = len(self.ctx.strategies)
+        return exit_code
+
     def not_finished(self) -> bool:
         """Determine whether or not the WorkChain is finished.
 
@@ -161,9 +212,22 @@ class OTEPipeline(WorkChain):
         """Prepare the current step for submission.
 
         Run the next strategy's CalcFunction and return its ProcessNode to the context.
+        The `get` of transformations is submitted instead, so that the worker is not
+        blocked while waiting for the transformation to finish.
 
         """
         strategy_method, strategy_type, strategy_config = self.ctx.strategies[self.ctx.current_id]
+        if (strategy_method, strategy_type) == ("get", "transformation"):
+            self.to_context(
+                current=self.submit(
+                    GetTransformation,
+                    config=strategy_config,
+                    session=self.ctx.ote_session,
+                    **self.exposed_inputs(GetTransformation, namespace="transformation"),
+                )
+            )
+            return
+
         strategy_process_cls = (
             WorkflowFactory(f"execflow.{strategy_type}_{strategy_method}")
             if strategy_type in ("function", "transformation")
@@ -178,10 +242,10 @@ class OTEPipeline(WorkChain):
             )[1]
         )
 
-    def process_current(self) -> None:
+    def process_current(self) -> ExitCode | None:
         """Process the current step's Node.
 
-        Report if the process did not finish OK.
+        Report and fail if the process did not finish OK.
         Retrieve the return session update object, update the session and store it back
         to the context for the next strategy to use.
 
@@ -191,16 +255,23 @@ class OTEPipeline(WorkChain):
                 f"A subprocess failed with exit status {self.ctx.current.exit_status}:"
                 f" {self.ctx.current.exit_message}"
             )
+            return self.exit_codes.ERROR_SUBPROCESS
 
         self.ctx.ote_session = self.ctx.current.base.links.get_outgoing().get_node_by_label("result")
 
         self.ctx.current_id += 1
+        return None
 
     def finalize(self) -> None:
         """Finalize the WorkChain.
 
-        Set the 'session' output.
+        Set the 'session' output, holding the full session.
         """
+        if not isinstance(self.ctx.ote_session, orm.Dict):
+            self.ctx.ote_session = run(
+                CalculationFactory("execflow.materialize_oteapi_session"),
+                session=self.ctx.ote_session,
+            )
         self.out("session", self.ctx.ote_session)
 
         if "to_results" in self.ctx.ote_session:
@@ -217,3 +288,8 @@ class OTEPipeline(WorkChain):
             coll_id = orm.Str(self.ctx.ote_session["collection_id"])
             coll_id.store()
             self.out("collection_id", coll_id)
+
+    def on_terminated(self) -> None:
+        """Close the pooled strategy instances, also when the WorkChain failed."""
+        super().on_terminated()
+        close_pool(self.node.uuid)
@@ -1,6 +1,10 @@
 from __future__ import annotations
 
+import shutil
+
 from aiida import engine, orm
+import numpy as np
+import pytest
 
 from execflow.workchains.declarative_chain import DeclarativeChain
 
@@ -11,3 +15,301 @@ def test_execwrapper(samples):
     print(res)
 
     assert res["results"]["stdout"].get_content()[0] == "7"
+
+
+def test_code_cache(fixture_localhost, monkeypatch):
+    from execflow.workchains import exec_wrapper
+
+    code = exec_wrapper.get_code("bash", fixture_localhost)
+
+    def prepare_code(*_):
+        raise AssertionError("The code should be taken from the cache")
+
+    monkeypatch.setattr(exec_wrapper, "prepare_code", prepare_code)
+    assert exec_wrapper.get_code("bash", fixture_localhost).pk == code.pk
+
+
+def test_render_template(samples):
+    from execflow.workchains import exec_wrapper
+    from execflow.workchains.exec_wrapper import render_template
+
+    rendered = render_template(samples / "bc.template", {"a": 3, "b": 4})
+    assert rendered.get_content().strip() == "3+4"
+
+    # Identical template and parameters reuse the stored rendering
+    assert render_template(samples / "bc.template", orm.Dict({"b": 4, "a": 3})).pk == rendered.pk
+    assert render_template(samples / "bc.template", {"a": 3, "b": 5}).pk != rendered.pk
+
+    # Nodes not created by `fill_template` are never taken for a rendering
+    forged = orm.SinglefileData(samples / "bc.template").store()
+    forged.base.extras.set(exec_wrapper.TEMPLATE_HASH_EXTRA, rendered.base.extras.get(exec_wrapper.TEMPLATE_HASH_EXTRA))
+    rendered.base.extras.delete(exec_wrapper.TEMPLATE_HASH_EXTRA)
+    assert render_template(samples / "bc.template", {"a": 3, "b": 4}).pk not in (forged.pk, rendered.pk)
+
+    # Parameters that cannot be serialized to JSON are rendered without the cache
+    assert render_template(samples / "bc.template", {"a": np.int64(3), "b": 4}).get_content().strip() == "3+4"
+
+
+def test_compiled_template(monkeypatch):
+    from io import StringIO
+
+    import chevron
+
+    from execflow.workchains.exec_wrapper import TEMPLATES, compile_template, render_tokens
+
+    template = "{{a}}\n{{#items}}\n- {{name}} {{{raw}}}\n{{/items}}\n{{^missing}}none{{/missing}} {{b}}\n"
+    data = {"a": "<a>", "items": [{"name": "x", "raw": "<x>"}, {"name": "y", "raw": "&"}], "b": 4}
+
+    tokens = compile_template(template)
+    assert compile_template(template) is tokens
+    assert tokens in TEMPLATES.values()
+
+    # The least recently used templates are evicted
+    monkeypatch.setattr("execflow.workchains.exec_wrapper.TEMPLATE_CACHE_SIZE", 2)
+    compile_template("{{c}}")
+    compile_template(template)
+    compile_template("{{d}}")
+    assert len(TEMPLATES) == 2
+    assert compile_template(template) is tokens
+
+    handle = StringIO()
+    render_tokens(tokens, data, handle)
+    assert handle.getvalue() == chevron.render(template, data)
+
+
+def test_execwrapper_batch(samples):
+    res = engine.run(DeclarativeChain, workchain_specification=orm.Str(samples / "exec_wrapper_batch.yaml"))
+
+    assert res["results"]["batch_0"].get_object_content("stdout")[0] == "7"
+    assert res["results"]["batch_1"].get_object_content("stdout")[0] == "3"
+
+
+def test_execwrapper_resources(samples):
+    from aiida.orm import CalcJobNode, QueryBuilder
+
+    res = engine.run(DeclarativeChain, workchain_specification=orm.Str(samples / "exec_wrapper_resources.yaml"))
+    assert res["results"]["stdout"].get_content()[0] == "7"
+
+    shelljob = QueryBuilder().append(CalcJobNode).one()[0]
+    assert shelljob.get_option("resources") == {"num_machines": 1, "num_mpiprocs_per_machine": 2}
+    assert not shelljob.get_option("withmpi")
+
+
+@pytest.mark.skipif(shutil.which("mpirun") is None, reason="MPI is not installed")
+def test_execwrapper_mpi(fixture_localhost, monkeypatch):
+    from aiida.plugins import WorkflowFactory
+
+    # Open MPI refuses to run as root otherwise, e.g. in containers
+    monkeypatch.setenv("OMPI_ALLOW_RUN_AS_ROOT", "1")
+    monkeypatch.setenv("OMPI_ALLOW_RUN_AS_ROOT_CONFIRM", "1")
+    options = {
+        "withmpi": True,
+        "resources": {"num_machines": 1, "num_mpiprocs_per_machine": 2},
+        "mpirun_extra_params": ["--oversubscribe"],
+    }
+    res = engine.run(
+        WorkflowFactory("execflow.exec_wrapper"),
+        files={},
+        command=orm.Str("echo"),
+        arguments=orm.List(["hello"]),
+        shelljob={"metadata": {"computer": fixture_localhost, "options": options}},
+    )
+    assert res["stdout"].get_content().split() == ["hello", "hello"]
+
+    # The bash script driving several commands would be launched once per process
+    with pytest.raises(ValueError, match="withmpi"):
+        engine.run(
+            WorkflowFactory("execflow.exec_wrapper"),
+            files={},
+            commands=orm.List([{"command": "echo", "arguments": ["hello"]}]),
+            shelljob={"metadata": {"computer": fixture_localhost, "options": options}},
+        )
+
+
+def test_shelljob_metadata_parallel_environment(generate_workchain, tmp_path):
+    from execflow.workchains.exec_wrapper import get_code
+
+    computer = orm.Computer(
+        label="sge", hostname="localhost", transport_type="core.local", scheduler_type="core.sge", workdir=str(tmp_path)
+    ).store()
+    computer.configure()
+
+    resources = {"parallel_env": "mpi", "tot_num_mpiprocs": 4}
+    process = generate_workchain(
+        "execflow.exec_wrapper",
+        {"files": {}, "command": orm.Str("bash"), "shelljob": {"metadata": {"options": {"resources": resources}}}},
+    )
+    process.ctx.code = get_code("bash", computer)
+    assert process.get_shelljob_metadata()["options"]["resources"] == resources
+
+
+def test_execwrapper_commands(samples):
+    res = engine.run(DeclarativeChain, workchain_specification=orm.Str(samples / "exec_wrapper_commands.yaml"))
+
+    assert res["results"]["stdout"].get_content()[0] == "7"
+
+
+def test_execwrapper_staged(samples):
+    res = engine.run(DeclarativeChain, workchain_specification=orm.Str(samples / "exec_wrapper_staged.yaml"))
+
+    assert res["results"]["stdout"].get_content()[0] == "7"
+
+
+def test_stage_file(fixture_localhost, tmp_path):
+    from io import StringIO
+
+    from aiida.common.links import LinkType
+    from plumpy.process_states import ProcessState
+
+    from execflow.utils.staging import STAGING_DIR_PROPERTY, STAGING_MAX_SIZE_PROPERTY, stage_file
+
+    fixture_localhost.set_property(STAGING_DIR_PROPERTY, str(tmp_path))
+    node = orm.SinglefileData(StringIO("3+4\n")).store()
+
+    remote = stage_file(node, "bc.in", fixture_localhost)
+    assert (tmp_path / remote.get_remote_path() / "bc.in").read_text() == "3+4\n"
+    assert remote.creator.inputs.node.pk == node.pk
+
+    # The same content is not uploaded again
+    (tmp_path / remote.get_remote_path() / "bc.in").write_text("cached")
+    assert stage_file(node, "bc.in", fixture_localhost).get_remote_path() == remote.get_remote_path()
+    assert (tmp_path / remote.get_remote_path() / "bc.in").read_text() == "cached"
+
+    # Staging other content evicts the least recently used files above the size limit
+    fixture_localhost.set_property(STAGING_MAX_SIZE_PROPERTY, 0)
+    other = stage_file(orm.SinglefileData(StringIO("5+6\n")).store(), "bc.in", fixture_localhost)
+    assert (tmp_path / other.get_remote_path() / "bc.in").exists()
+    assert not (tmp_path / remote.get_remote_path()).exists()
+
+    # Files that are inputs of calculations that have not terminated are not evicted
+    calculation = orm.CalcJobNode(computer=fixture_localhost, process_type="aiida.calculations:core.shell")
+    calculation.base.links.add_incoming(other, LinkType.INPUT_CALC, "nodes__bc")
+    calculation.set_process_state(ProcessState.WAITING)
+    calculation.store()
+    stage_file(orm.SinglefileData(StringIO("7+8\n")).store(), "bc.in", fixture_localhost)
+    assert (tmp_path / other.get_remote_path() / "bc.in").exists()
+
+
+def test_execwrapper_retrieve(samples):
+    res = engine.run(DeclarativeChain, workchain_specification=orm.Str(samples / "exec_wrapper_retrieve.yaml"))
+
+    # Only the tail of stdout is retrieved, the full stdout is left on the computer
+    assert res["results"]["stdout"].get_content() == "100\n"
+    assert "stdout_full" in res["results"]["remote"].listdir()
+
+
+def test_retrieval_script(tmp_path):
+    import subprocess
+
+    from execflow.workchains.exec_wrapper import SCRIPT, get_retrieval_script
+
+    command_line = "head -c 100 /dev/zero > big.dat && echo 1 > small.dat && echo 1 > run.log"
+    script = get_retrieval_script(
+        SCRIPT.format(command=command_line), {"exclude": ["*.log"], "max_size": 10, "keep_remote": True}, ["*.dat"]
+    )
+    (tmp_path / "run.sh").write_text(script)
+    subprocess.run(["bash", "run.sh"], cwd=tmp_path, check=True)
+
+    assert (tmp_path / "small.dat").exists()
+    assert (tmp_path / "_remote" / "big.dat").exists()
+    assert (tmp_path / "_remote" / "run.log").exists()
+
+
+def test_execwrapper_retrieve_explicit(fixture_localhost):
+    from aiida.plugins import WorkflowFactory
+
+    res = engine.run(
+        WorkflowFactory("execflow.exec_wrapper"),
+        files={},
+        commands=orm.List(
+            [
+                {"command": "truncate", "arguments": ["-s", "100", "big.dat"]},
+                {"command": "touch", "arguments": ["small.dat", "run.log"]},
+                {"command": "seq", "arguments": ["1", "100"]},
+            ]
+        ),
+        retrieve=orm.Dict({"include": ["big.dat", "small.dat", "run.log"], "exclude": ["*.log"], "max_size": 50}),
+        shelljob={"metadata": {"computer": fixture_localhost}},
+    )
+
+    # Explicitly included files that are too large or excluded are not reported missing
+    assert "small_dat" in res
+    assert "big_dat" not in res
+    assert "run_log" not in res
+    # Nor are stdout and stderr larger than `max_size` retrieved
+    assert res["stdout"].get_content() == ""
+
+
+def test_as_glob(tmp_path):
+    from execflow.workchains.exec_wrapper import as_glob
+
+    for name in ("out.dat", "sub/out", "out]", "out!", "out-"):
+        (tmp_path / name).parent.mkdir(exist_ok=True)
+        (tmp_path / name).touch()
+        (tmp_path / f"{name}.bak").touch()
+        assert "*" in as_glob(name)
+        assert list(tmp_path.glob(as_glob(name))) == [tmp_path / name]
+
+
+def test_execwrapper_warm(samples):
+    res = engine.run(DeclarativeChain, workchain_specification=orm.Str(samples / "exec_wrapper_warm.yaml"))
+
+    assert res["results"]["stdout"].get_content().strip() == "Mys0Cg=="
+
+
+def test_warm_pool(tmp_path, monkeypatch):
+    import os
+    import subprocess
+    import sys
+
+    from execflow.utils.warm_pool import SCRIPT, get_socket_path, stop_server
+
+    tool = tmp_path / "warm_tool.py"
+    tool.write_text(
+        "import os\nimport sys\n\nif __name__ == '__main__':\n    print(os.getppid())\n    sys.exit(int(sys.argv[1]))\n"
+    )
+    monkeypatch.setenv("PYTHONPATH", str(tmp_path))
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+
+    def run(status):
+        return subprocess.run(
+            [sys.executable, str(SCRIPT), "--idle-timeout", "10", "warm_tool", str(status)],
+            cwd=tmp_path,
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+
+    try:
+        first, second = run(0), run(3)
+        assert (first.returncode, second.returncode) == (0, 3)
+        # Both runs are forked from the same server, whose socket is private
+        assert first.stdout == second.stdout
+        assert get_socket_path("warm_tool").exists()
+        assert get_socket_path("warm_tool").parent.stat().st_mode & 0o777 == 0o700
+
+        # A server with the modified code replaces the stale one
+        os.utime(tool, (tool.stat().st_atime, tool.stat().st_mtime + 1))
+        third = run(0)
+        assert third.returncode == 0
+        assert third.stdout != first.stdout
+    finally:
+        stop_server("warm_tool")
+    assert not get_socket_path("warm_tool").exists()
+
+
+def test_execwrapper_parsers(samples):
+    res = engine.run(DeclarativeChain, workchain_specification=orm.Str(samples / "exec_wrapper_parsers.yaml"))
+
+    assert res["results"]["xy"].get_array("x").tolist() == [1, 3]
+    assert res["results"]["xy"].get_array("y").tolist() == [2, 4]
+
+
+def test_parse_array():
+    from io import StringIO
+
+    from execflow.workchains.exec_wrapper import parse_array
+
+    file = orm.SinglefileData(StringIO("1,2,3\n4,5,6\n"))
+    array = parse_array(file, orm.Dict({"delimiter": ",", "columns": [0, 2]}))
+    assert array.get_array("data").tolist() == [[1.0, 3.0], [4.0, 6.0]]
@@ -0,0 +1,13 @@
+from __future__ import annotations
+
+
+def test_lazy_refs(generate_declarative_workchain, samples):
+    process = generate_declarative_workchain(samples / "declarative_chain" / "lazy_refs.yaml")
+    # The missing file is referenced by a step that is never reached, so it is never loaded
+    process.setup()
+    assert process.ctx.steps[1]["inputs"]["x"] == {"$ref": "#/data/x"}
+
+    _, inputs = process.next_step()
+    assert process.ctx.current_id == 1
+    assert inputs["x"] == 3
+    assert inputs["y"] == 1
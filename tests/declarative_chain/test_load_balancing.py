@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from plumpy.process_states import ProcessState
+
+from execflow.workchains.declarative_chain import dict2code
+
+
+def test_load_balancing(fixture_localhost, tmp_path):
+    from aiida.orm import CalcJobNode, Computer, InstalledCode
+
+    computers = [fixture_localhost]
+    for i in range(2):
+        computers.append(
+            Computer(
+                label=f"localhost_{i}",
+                hostname="localhost",
+                transport_type="core.local",
+                scheduler_type="core.direct",
+                workdir=str(tmp_path / str(i)),
+            ).store()
+        )
+    for computer in computers:
+        InstalledCode(label="bash", computer=computer, filepath_executable="/bin/bash").store()
+
+    codes = [f"bash@{computer.label}" for computer in computers]
+
+    # On ties the first code is picked
+    assert dict2code(codes).computer.pk == computers[0].pk
+
+    for computer in computers[:2]:
+        node = CalcJobNode(computer=computer, process_type="core.arithmetic.add")
+        node.set_process_state(ProcessState.RUNNING)
+        node.store()
+
+    assert dict2code(codes).computer.pk == computers[2].pk
+
+
+def test_load_balancing_execwrapper(generate_workchain, fixture_localhost, tmp_path):
+    from aiida.orm import CalcJobNode, Computer, List, Str
+
+    other = Computer(
+        label="localhost_other",
+        hostname="localhost",
+        transport_type="core.local",
+        scheduler_type="core.direct",
+        workdir=str(tmp_path),
+    ).store()
+    other.configure()
+
+    node = CalcJobNode(computer=fixture_localhost, process_type="core.arithmetic.add")
+    node.set_process_state(ProcessState.RUNNING)
+    node.store()
+
+    process = generate_workchain(
+        "execflow.exec_wrapper",
+        {"files": {}, "command": Str("bash"), "computers": List([fixture_localhost.label, other.label])},
+    )
+    process.setup()
+    process.register_code()
+    assert process.ctx.code.computer.pk == other.pk
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+from plumpy.process_states import ProcessState
+
+from execflow.utils.submission_queue import MAX_CONCURRENT_PROPERTY, QUEUE_EXTRA, get_waiting, request_slot
+
+
+def test_priority(generate_declarative_workchain, generate_calcjob_node, fixture_localhost, samples):
+    fixture_localhost.set_property(MAX_CONCURRENT_PROPERTY, 2)
+
+    in_flight = []
+    for _ in range(2):
+        node = generate_calcjob_node("execflow.fake_qe_pw")
+        node.set_process_state(ProcessState.WAITING)
+        in_flight.append(node.store())
+
+    high = generate_declarative_workchain(samples / "declarative_chain" / "qe_basic.yaml").node
+    low = generate_declarative_workchain(samples / "declarative_chain" / "qe_basic.yaml").node
+
+    # Computer is full, both chains have to wait for any in-flight calcjob
+    assert request_slot(high, fixture_localhost, priority=10) == in_flight
+    assert request_slot(low, fixture_localhost, priority=0) == in_flight
+
+    in_flight[0].set_process_state(ProcessState.FINISHED)
+
+    # One slot is free, it goes to the chain with the highest priority
+    assert request_slot(low, fixture_localhost, priority=0) == in_flight[1:]
+    assert request_slot(high, fixture_localhost, priority=10) is None
+    assert QUEUE_EXTRA not in high.base.extras
+    assert QUEUE_EXTRA in low.base.extras
+
+
+def test_priority_uncapped(generate_declarative_workchain, fixture_localhost, samples):
+    chain = generate_declarative_workchain(samples / "declarative_chain" / "qe_basic.yaml").node
+
+    assert request_slot(chain, fixture_localhost) is None
+    assert request_slot(chain, None) is None
+
+
+def test_priority_inactive(generate_declarative_workchain, generate_calcjob_node, fixture_localhost, samples):
+    fixture_localhost.set_property(MAX_CONCURRENT_PROPERTY, 2)
+
+    node = generate_calcjob_node("execflow.fake_qe_pw")
+    node.set_process_state(ProcessState.WAITING)
+    node.store()
+
+    # A chain that is not active is not listed as waiting, but can still get a free slot
+    chain = generate_declarative_workchain(samples / "declarative_chain" / "qe_basic.yaml").node
+    chain.set_process_state(ProcessState.EXCEPTED)
+    assert request_slot(chain, fixture_localhost) is None
+
+
+def test_priority_fair_share(generate_calcjob_node, fixture_localhost):
+    from aiida import orm
+
+    fixture_localhost.set_property(MAX_CONCURRENT_PROPERTY, 2)
+    busy = orm.User(email="busy@execflow").store()
+
+    in_flight = []
+    for _ in range(2):
+        node = generate_calcjob_node("execflow.fake_qe_pw")
+        node.user = busy
+        node.set_process_state(ProcessState.WAITING)
+        in_flight.append(node.store())
+
+    chains = {}
+    for label, user in (("busy", busy), ("idle", orm.User.collection.get_default())):
+        chains[label] = orm.WorkflowNode(user=user)
+        chains[label].set_process_state(ProcessState.WAITING)
+        chains[label].store()
+
+    # The chain of the busy user queued first
+    assert request_slot(chains["busy"], fixture_localhost) == in_flight
+    assert request_slot(chains["idle"], fixture_localhost) == in_flight
+    assert [_.pk for _ in get_waiting(fixture_localhost)] == [chains["idle"].pk, chains["busy"].pk]
+
+    in_flight[0].set_process_state(ProcessState.FINISHED)
+    assert request_slot(chains["busy"], fixture_localhost) == in_flight[1:]
+    assert request_slot(chains["idle"], fixture_localhost) is None
+
+
+def test_priority_wake_up(generate_declarative_workchain, generate_calcjob_node, samples):
+    from aiida.engine import append_
+
+    process = generate_declarative_workchain(samples / "declarative_chain" / "qe_basic.yaml")
+    blockers = [generate_calcjob_node("execflow.fake_qe_pw").store() for _ in range(2)]
+
+    process.ctx.queue_blockers = []
+    for blocker in blockers:
+        process.to_context(queue_blockers=append_(blocker))
+    first, second = process._awaitables
+
+    # Any terminated in-flight calcjob frees the chain
+    process._on_awaitable_finished(second)
+    assert not process._awaitables
+    # The other one terminating later is ignored
+    process._on_awaitable_finished(first)
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import io
+
+import pytest
+
+from execflow.workchains.declarative_chain import PSEUDO_FAMILIES, dict2datanode
+
+
+def test_pseudos():
+    from aiida.orm import Group, load_node
+    from aiida_pseudo.data.pseudo.upf import UpfData
+
+    group = Group(label="test_pseudos").store()
+    for element in ("Ni", "O"):
+        content = f'<UPF version="2.0.1">\n<PP_HEADER\nelement="{element}"\nz_valence="4.0"\n/>\n</UPF>\n'
+        group.add_nodes(UpfData(io.BytesIO(content.encode()), filename=f"{element}.upf").store())
+
+    pseudos = {
+        "Ni1": {"group": "test_pseudos", "element": "Ni"},
+        "Ni2": {"group": "test_pseudos", "element": "Ni"},
+        "O": {"group": "test_pseudos", "element": "O"},
+    }
+    nodes = dict2datanode(pseudos, UpfData, dynamic=True)
+
+    assert nodes["Ni1"].element == "Ni"
+    assert nodes["Ni1"].pk == nodes["Ni2"].pk
+    assert nodes["O"].element == "O"
+    assert set(PSEUDO_FAMILIES["test_pseudos"]) == {"Ni", "O"}
+
+    with pytest.raises(ValueError, match="does not contain pseudo"):
+        dict2datanode({"Si": {"group": "test_pseudos", "element": "Si"}}, UpfData, dynamic=True)
+
+    # The cache follows the elements added to and the pseudos removed from the family
+    content = '<UPF version="2.0.1">\n<PP_HEADER\nelement="Si"\nz_valence="4.0"\n/>\n</UPF>\n'
+    group.add_nodes(UpfData(io.BytesIO(content.encode()), filename="Si.upf").store())
+    nodes = dict2datanode({"Si": {"group": "test_pseudos", "element": "Si"}}, UpfData, dynamic=True)
+    assert nodes["Si"].element == "Si"
+
+    group.remove_nodes(load_node(PSEUDO_FAMILIES["test_pseudos"]["O"]))
+    with pytest.raises(ValueError, match="does not contain pseudo"):
+        dict2datanode({"O": {"group": "test_pseudos", "element": "O"}}, UpfData, dynamic=True)
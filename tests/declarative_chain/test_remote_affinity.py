@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+
+def test_remote_affinity(generate_declarative_workchain, fixture_localhost, samples, tmp_path):
+    from aiida.orm import Computer, InstalledCode, RemoteData
+
+    remote = Computer(
+        label="remote",
+        hostname="localhost",
+        transport_type="core.local",
+        scheduler_type="core.direct",
+        workdir=str(tmp_path),
+    ).store()
+    for computer in (fixture_localhost, remote):
+        InstalledCode(label="bash", computer=computer, filepath_executable="/bin/bash").store()
+
+    process = generate_declarative_workchain(samples / "declarative_chain" / "remote_affinity.yaml")
+    process.setup()
+    process.ctx.scf_dir = RemoteData(computer=remote, remote_path=str(tmp_path)).store()
+
+    _, inputs = process.next_step()
+
+    # The least loaded code would be the first one, but the parent folder pins the computer
+    assert inputs["code"].computer.pk == remote.pk
+    assert inputs["settings"]["PARENT_FOLDER_SYMLINK"]
+    assert inputs["settings"]["CMDLINE"] == ["-nk", "2"]
+
+
+def test_remote_affinity_missing_code(generate_declarative_workchain, fixture_localhost, samples, tmp_path):
+    from aiida.orm import Computer, InstalledCode, RemoteData
+
+    computers = {}
+    for label in ("remote", "elsewhere"):
+        computers[label] = Computer(
+            label=label,
+            hostname="localhost",
+            transport_type="core.local",
+            scheduler_type="core.direct",
+            workdir=str(tmp_path),
+        ).store()
+    for computer in (fixture_localhost, computers["remote"]):
+        InstalledCode(label="bash", computer=computer, filepath_executable="/bin/bash").store()
+
+    process = generate_declarative_workchain(samples / "declarative_chain" / "remote_affinity.yaml")
+    process.setup()
+    process.ctx.scf_dir = RemoteData(computer=computers["elsewhere"], remote_path=str(tmp_path)).store()
+
+    # The parent folder cannot be copied to the computers of the codes
+    assert process.next_step() == process.exit_codes.ERROR_REMOTE_COMPUTER
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import pytest
+
+
+def test_scratch(generate_declarative_workchain, samples):
+    process = generate_declarative_workchain(samples / "declarative_chain" / "scratch.yaml")
+    process.setup()
+
+    assert "values" not in process.ctx
+    assert process.ctx.scratch_nodes == {}
+    assert process.scratch["values"] == [1, 2, 3]
+
+    _, inputs = process.next_step()
+    assert inputs["x"] == 1
+    assert inputs["y"] == 3
+
+
+def test_scratch_reload(generate_declarative_workchain, samples):
+    from aiida.orm import Int
+
+    process = generate_declarative_workchain(samples / "declarative_chain" / "scratch.yaml")
+    process.setup()
+
+    node = Int(5).store()
+    process.to_scratch(node, "node")
+    assert process.ctx.scratch_nodes == {"node": node.pk}
+
+    # Simulate a restart of the worker: only the stored node can be recovered
+    del process._scratch
+    assert "values" not in process.scratch
+    assert process.scratch["node"].pk == node.pk
+
+    # Lost values are not silently rendered as undefined
+    with pytest.raises(ValueError, match="`values` was lost"):
+        process.eval_template("{{ scratch['values'] }}")
+    with pytest.raises(KeyError):
+        process.scratch["unknown"]
+
+    process.to_scratch([4], "values")
+    assert process.eval_template("{{ scratch['values'][0] }}") == 4
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from time import time
+
+from plumpy.process_states import ProcessState
+
+from execflow.workchains.declarative_chain import TIMED_OUT_EXTRA
+
+
+def test_timeout(generate_declarative_workchain, generate_calcjob_node, fixture_localhost, samples):
+    from aiida.orm import InstalledCode
+
+    InstalledCode(label="bash", computer=fixture_localhost, filepath_executable="/bin/bash").store()
+    process = generate_declarative_workchain(samples / "declarative_chain" / "timeout.yaml")
+    process.setup()
+
+    for index, step in enumerate(process.ctx.steps):
+        node = generate_calcjob_node("core.arithmetic.add")
+        node.set_process_state(ProcessState.KILLED)
+        node.store()
+
+        process.next_step()
+        process.arm_timeout(node, step)
+        assert process.ctx.timeout_child["pk"] == node.pk
+        assert process.ctx.timeout_child["deadline"] > time()
+
+        process.ctx.current = node
+        if index == 0:
+            process.ctx.timed_out = True
+        else:
+            # As after a restart, where only the extra survived
+            process.node.base.extras.set(TIMED_OUT_EXTRA, node.pk)
+        exit_code = process.process_current()
+        assert process.ctx.timeout_child is None
+        assert TIMED_OUT_EXTRA not in process.node.base.extras
+
+    # The first step continues through its `on_timeout` branch, the second one errors
+    assert process.ctx.timed_out_once
+    assert process.ctx.current_id == 1
+    assert exit_code.status == 1234
+
+
+def test_chain_timeout(generate_workchain, samples):
+    from aiida.orm import Float, SinglefileData
+
+    process = generate_workchain(
+        "execflow.declarative",
+        {
+            "workchain_specification": SinglefileData(samples / "declarative_chain" / "timeout.yaml"),
+            "timeout": Float(0),
+        },
+    )
+    process.setup()
+
+    assert process.submit_next() == process.exit_codes.ERROR_TIMEOUT
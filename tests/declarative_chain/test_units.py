@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import pytest
+
 from execflow.calculations.fake import FakeQEPW
 
 
@@ -48,5 +50,44 @@ def test_qe(generate_declarative_workchain, generate_calcjob_node, samples):
     assert process.ctx.results["parameters"] == inputs["parameters"]
 
 
+def test_store_inputs(generate_declarative_workchain, samples):
+    from execflow.workchains.declarative_chain import find_nodes, store_nodes
+
+    process = generate_declarative_workchain(samples / "declarative_chain" / "qe_basic.yaml")
+    process.setup()
+    _, inputs = process.next_step()
+
+    nodes = find_nodes(inputs)
+    assert len(nodes) == 3
+    assert not any(node.is_stored for node in nodes)
+
+    store_nodes(inputs)
+    assert all(node.is_stored for node in nodes)
+    assert all(node.base.caching.get_hash() == node.base.extras.get("_aiida_hash") for node in nodes)
+
+
+def test_store_inputs_checks():
+    """The `store` of the node classes is used, with its checks, and nothing is stored if one fails."""
+    import io
+
+    from aiida.common.exceptions import StoringNotAllowed
+    from aiida.orm import Int, QueryBuilder, load_node
+    from aiida_pseudo.data.pseudo.upf import UpfData
+
+    from execflow.workchains.declarative_chain import store_nodes
+
+    content = b'<UPF version="2.0.1">\n<PP_HEADER\nelement="Si"\nz_valence="4.0"\n/>\n</UPF>\n'
+    invalid = UpfData(io.BytesIO(content), filename="Si.upf")
+    invalid.base.attributes.set("element", None)
+    with pytest.raises(StoringNotAllowed):
+        store_nodes({"number": Int(1), "pseudo": invalid})
+    assert QueryBuilder().append(Int).count() == 0
+
+    pseudo = UpfData(io.BytesIO(content), filename="Si.upf")
+    store_nodes({"number": Int(1), "pseudo": pseudo})
+    assert pseudo.is_stored
+    assert pseudo.md5 == load_node(pseudo.pk).md5
+
+
 # TODO: while if syntax test
 # TODO: user type define test
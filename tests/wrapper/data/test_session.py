@@ -0,0 +1,89 @@
+"""Test execflow.data.oteapi.session"""
+
+from __future__ import annotations
+
+import pytest
+
+
+def test_reconstruction() -> None:
+    """Ensure the full session is reconstructed from the chain of updates."""
+    from aiida import orm
+
+    from execflow.data.oteapi.session import SESSIONS, SessionUpdateData
+
+    base = orm.Dict({"a": 1, "b": 1}).store()
+    first = SessionUpdateData({"b": 2}, parent=base).store()
+    second = SessionUpdateData({"c": 3}, parent=first).store()
+
+    assert second.updates == {"c": 3}
+    assert second.get_dict() == {"a": 1, "b": 2, "c": 3}
+    assert second["b"] == 2
+    assert "c" in second
+    assert "c" not in first
+
+    # The reconstructed session is cached and protected from modifications
+    assert second.uuid in SESSIONS
+    second.get_dict()["a"] = 0
+    assert second["a"] == 1
+
+    # Only the update of the child is applied on top of the cached session
+    SESSIONS[second.uuid]["a"] = 0
+    third = SessionUpdateData({"d": 4}, parent=second).store()
+    assert third.get_dict() == {"a": 0, "b": 2, "c": 3, "d": 4}
+
+    # Single entries are read from the cached session, without copying it
+    fourth = SessionUpdateData({"e": [5]}, parent=third).store()
+    assert fourth["e"] is fourth.get("e")
+    assert fourth.get_dict()["e"] is not fourth["e"]
+    SESSIONS.clear()
+
+
+def test_unstored_parent() -> None:
+    """The parent of an update must be stored to be referenced."""
+    from aiida import orm
+
+    from execflow.data.oteapi.session import SessionUpdateData
+
+    with pytest.raises(ValueError, match="must be stored"):
+        SessionUpdateData({"a": 1}, parent=orm.Dict({}))
+
+
+def test_blobs(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Ensure large values are stored as blobs and resolved transparently."""
+    from aiida import orm
+
+    from execflow.calculations.update_oteapi_session import materialize_oteapi_session, update_oteapi_session
+    from execflow.data.oteapi import blobs
+    from execflow.data.oteapi.session import SESSIONS, SessionUpdateData
+
+    monkeypatch.setattr(blobs, "BLOB_THRESHOLD", 100)
+    large = {"content": "x" * 100}
+    # Not mistaken for a reference when read back
+    lookalike = {blobs.BLOB_KEY: {"sha256": "0" * 64, "node": "unknown"}}
+
+    base = orm.Dict({"a": 1}).store()
+    update = SessionUpdateData({"b": 2, "large": large, "lookalike": lookalike}, parent=base).store()
+
+    reference = update.base.attributes.get("updates")["large"]
+    assert blobs.is_blob_reference(reference)
+    assert reference[blobs.BLOB_KEY]["node"] == update.uuid
+    assert update.base.attributes.get("updates")["b"] == 2
+    assert f"{reference[blobs.BLOB_KEY]['sha256']}.json" in update.base.repository.list_object_names(blobs.BLOB_DIR)
+
+    assert update.updates == {"b": 2, "large": large, "lookalike": lookalike}
+    assert update.get_dict() == {"a": 1, "b": 2, "large": large, "lookalike": lookalike}
+
+    # Updates given as a `Dict` by the workfunctions of the strategies, whose blobs are referred to
+    updates = blobs.blob_dict({"c": large})
+    assert blobs.is_blob_reference(updates["c"])
+    result = update_oteapi_session(session=update, updates=updates)
+    assert result.base.attributes.get("updates") == updates.get_dict()
+    assert result.base.repository.list_object_names() == []
+    assert result.updates == {"c": large}
+    assert result.get_dict() == {"a": 1, "b": 2, "large": large, "lookalike": lookalike, "c": large}
+
+    # The final session holds the large values themselves
+    session = materialize_oteapi_session(session=result)
+    assert session["large"]["content"] == large["content"]
+    assert session.get_dict() == result.get_dict()
+    SESSIONS.clear()
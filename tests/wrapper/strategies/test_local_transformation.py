@@ -0,0 +1,117 @@
+"""Test execflow.data.local_transformation"""
+
+from __future__ import annotations
+
+import pytest
+
+
+def run_until_finished(strategy, session: dict):
+    from time import sleep
+
+    from execflow.oteapi_strategies.transformation import is_finished
+
+    status = strategy.run(session)
+    while not is_finished(status):
+        sleep(0.1)
+        status = strategy.status(status.id)
+    return status
+
+
+def test_local_transformation() -> None:
+    """Run functions in the local process pool."""
+    from execflow.data import local_transformation
+    from execflow.oteapi_strategies.registry import create_strategy
+
+    config = {"transformationType": "local/processpool", "configuration": {"function": "json:loads"}}
+
+    config["configuration"]["args"] = ['{"answer": 42}']
+    strategy = create_strategy("transformation", config)
+    assert run_until_finished(strategy, {}).status == "SUCCESS"
+    assert strategy.get({}) == {"answer": 42}
+
+    config["configuration"]["args"] = ["not json"]
+    strategy = create_strategy("transformation", config)
+    status = run_until_finished(strategy, {})
+    assert status.status == "FAILURE"
+    assert "JSONDecodeError" in status.messages[0]
+    with pytest.raises(ValueError, match="Expecting value"):
+        strategy.get({})
+
+    # Not tracked anymore once read
+    assert not local_transformation.FUTURES
+    assert not local_transformation.FINISH_TIMES
+
+
+def test_local_transformation_id() -> None:
+    """The result is looked up by the transformation ID in the session, whatever the instance."""
+    from execflow.oteapi_strategies.registry import create_strategy
+    from execflow.oteapi_strategies.transformation import TRANSFORMATION_ID_KEY
+
+    config = {"transformationType": "local/processpool", "configuration": {"function": "json:loads"}}
+    config["configuration"]["args"] = ['{"answer": 42}']
+    first = create_strategy("transformation", config)
+    first_status = run_until_finished(first, {})
+    config["configuration"]["args"] = ['{"answer": 43}']
+    second = create_strategy("transformation", config)
+    second_status = run_until_finished(second, {})
+
+    # E.g. a strategy instance that was reloaded, or shared by several transformations
+    reloaded = create_strategy("transformation", config)
+    assert reloaded.get({TRANSFORMATION_ID_KEY: first_status.id}) == {"answer": 42}
+    assert reloaded.get({TRANSFORMATION_ID_KEY: second_status.id}) == {"answer": 43}
+    with pytest.raises(RuntimeError, match="Unknown transformation"):
+        reloaded.get({TRANSFORMATION_ID_KEY: first_status.id})
+
+
+def test_local_transformation_cancel() -> None:
+    """Cancelled transformations are not tracked anymore, even if they were already running."""
+    from concurrent.futures import wait
+    from time import sleep
+
+    from execflow.data import local_transformation
+    from execflow.oteapi_strategies.registry import create_strategy
+
+    config = {"transformationType": "local/processpool", "configuration": {"function": "time:sleep", "args": [0.5]}}
+    strategy = create_strategy("transformation", config)
+    assert strategy.transformation_config.configuration.kwargs == {}
+
+    status = strategy.run({})
+    future = local_transformation.FUTURES[status.id]
+    strategy.cancel(status.id)
+    assert status.id not in local_transformation.FUTURES
+
+    wait([future])
+    # Let the done callbacks run
+    sleep(0.1)
+    assert status.id not in local_transformation.FINISH_TIMES
+    status = strategy.status(status.id)
+    assert status.status == "REVOKED"
+    assert "Unknown transformation" in status.messages[0]
+
+
+@pytest.mark.parametrize("fused", [False, True], ids=["default", "fused"])
+def test_local_transformation_pipeline(fused: bool) -> None:
+    """Run a pipeline with a local transformation, fully offline."""
+    from aiida import orm
+    from aiida.engine import run
+
+    from execflow.workchains.oteapi_pipeline import OTEPipeline
+
+    pipeline = {
+        "version": 1,
+        "strategies": [
+            {
+                "transformation": "local",
+                "transformationType": "local/processpool",
+                "configuration": {"function": "json:loads", "args": ['{"answer": 42}']},
+            }
+        ],
+        "pipelines": {"pipe": "local"},
+    }
+    result = run(
+        OTEPipeline,
+        pipeline=orm.Dict(pipeline),
+        fused=orm.Bool(fused),
+        transformation={"interval": orm.Float(0.1)},
+    )
+    assert result["session"]["answer"] == 42
@@ -0,0 +1,38 @@
+"""Test execflow.oteapi_strategies.registry"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pytest
+
+
+def test_registry(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Ensure the entry points are only loaded once per worker, until refreshed."""
+    from execflow.oteapi_strategies import registry
+
+    calls = []
+    load_strategies = registry.load_strategies
+    monkeypatch.setattr(registry, "load_strategies", lambda *args: calls.append(args) or load_strategies(*args))
+    monkeypatch.setattr(registry, "TIMINGS", {})
+
+    config = {
+        "mappingType": "triples",
+        "prefixes": {"map": "http://example.org/0.0.1/mapping_ontology#"},
+        "triples": [["http://onto-ns.com/meta/1.0/Foo#a", "map:mapsTo", "map:A"]],
+    }
+    first = registry.create_strategy("mapping", config)
+    second = registry.create_strategy("mapping", config)
+
+    assert first is not second
+    assert len(calls) == 1
+    implementation = type(first)
+    assert set(registry.TIMINGS) == {
+        "entry_points",
+        f"mapping:{implementation.__module__}.{implementation.__qualname__}",
+    }
+
+    registry.refresh_registry()
+    assert len(calls) == 2
+    assert set(registry.TIMINGS) == {"entry_points"}
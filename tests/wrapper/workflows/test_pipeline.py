@@ -9,6 +9,8 @@ import pytest
 if TYPE_CHECKING:
     from pathlib import Path
 
+    from oteapi.models import TransformationStatus
+
 
 def get_input_variants() -> dict[str, tuple[str, Path | bytes | dict]]:
     """Input for 'test_run_pipeline'.
@@ -103,3 +105,175 @@ def test_result_pipeline(samples: Path) -> None:
     assert result["session"]["prefixes"] == declarative_pipeline_file["strategies"][1]["prefixes"]
     for triple in result["session"]["triples"]:
         assert triple in declarative_pipeline_file["strategies"][1]["triples"]
+
+
+def test_result_pipeline_blobs(samples: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Run a simple pipeline whose session holds blobs and check the session is resolved.
+
+    Parameters:
+        samples: Path to test directory with sample files.
+        monkeypatch: Pytest fixture to store the parsed content as a blob.
+
+    """
+    from aiida.engine import run
+    from aiida.plugins import DataFactory
+    import requests
+    import yaml
+
+    from execflow.data.oteapi import blobs
+    from execflow.workchains.oteapi_pipeline import OTEPipeline
+
+    monkeypatch.setattr(blobs, "BLOB_THRESHOLD", 10)
+    entry_point, node_input = get_input_variants()["OTEPipelineData"]
+    result = run(OTEPipeline, pipeline=DataFactory(entry_point)(node_input))
+
+    declarative_pipeline_file = yaml.safe_load((samples / "pipe.yml").read_bytes())
+    json_file = requests.get(
+        declarative_pipeline_file["strategies"][0]["downloadUrl"],
+        timeout=5,
+    ).json()
+    assert result["session"]["content"] == json_file
+    assert result["session"]["prefixes"] == declarative_pipeline_file["strategies"][1]["prefixes"]
+
+
+def test_fused_pipeline() -> None:
+    """Run a simple pipeline in a single process and check it gives the same session."""
+    from aiida import orm
+    from aiida.engine import run, run_get_node
+    from aiida.plugins import DataFactory
+
+    from execflow.workchains.oteapi_pipeline import OTEPipeline
+
+    entry_point, node_input = get_input_variants()["OTEPipelineData"]
+    reference = run(OTEPipeline, pipeline=DataFactory(entry_point)(node_input))
+    result, node = run_get_node(OTEPipeline, pipeline=DataFactory(entry_point)(node_input), fused=orm.Bool(True))
+
+    # The parsing of the pipeline, the fused strategies and the output of the full session
+    assert len(node.called) == 3
+
+    # The session refers to the pipeline input node
+    session = {k: v for k, v in result["session"].items() if k != "pipeline"}
+    assert session == {k: v for k, v in reference["session"].items() if k != "pipeline"}
+
+
+def test_strategy_pool(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Ensure the `init` and `get` of a strategy share the same strategy instance."""
+    from aiida import orm
+    from aiida.engine import run
+
+    from execflow.oteapi_strategies import registry
+    from execflow.workchains.oteapi_pipeline import OTEPipeline
+
+    created = []
+    create_strategy = registry.create_strategy
+    monkeypatch.setattr(registry, "create_strategy", lambda *args: created.append(args[0]) or create_strategy(*args))
+
+    strategies = [
+        {
+            "mapping": f"map_{i}",
+            "mappingType": "triples",
+            "prefixes": {"map": "http://example.org/0.0.1/mapping_ontology#"},
+            "triples": [[f"http://onto-ns.com/meta/1.0/Foo#a{i}", "map:mapsTo", f"map:A{i}"]],
+        }
+        for i in range(2)
+    ]
+    pipeline = {"version": 1, "strategies": strategies, "pipelines": {"pipe": "map_0 | map_1"}}
+
+    for fused in (False, True):
+        created.clear()
+        run(OTEPipeline, pipeline=orm.Dict(pipeline), fused=orm.Bool(fused))
+        assert created == ["mapping", "mapping"]
+        assert not registry.POOLS
+
+
+class LocalTransformation:
+    """Stand-in transformation strategy, finishing `duration` seconds after being run."""
+
+    def __init__(self, config: dict) -> None:
+        self.duration = config["configuration"]["duration"]
+        # Times of the run and of the checks of the status
+        self.times = []
+
+    def initialize(self, session: dict) -> dict:  # noqa: ARG002
+        return {}
+
+    def run(self, session: dict) -> TransformationStatus:  # noqa: ARG002
+        from time import time
+
+        from oteapi.models import TransformationStatus
+
+        self.times.append(time())
+        return TransformationStatus(id=str(time() + self.duration), status="PENDING")
+
+    def status(self, task_id: str) -> TransformationStatus:
+        from datetime import datetime, timezone
+        from time import time
+
+        from oteapi.models import TransformationStatus
+
+        self.times.append(time())
+        if time() < float(task_id):
+            return TransformationStatus(id=task_id, status="STARTED")
+        return TransformationStatus(id=task_id, status="SUCCESS", finishTime=datetime.now(timezone.utc))
+
+    def get(self, session: dict) -> dict:  # noqa: ARG002
+        return {"intervals": [later - earlier for earlier, later in zip(self.times, self.times[1:])]}
+
+
+@pytest.mark.parametrize("fused", [False, True], ids=["process", "fused"])
+@pytest.mark.parametrize(("duration", "exit_status"), [(0.5, 0), (60, 400)], ids=["finished", "walltime"])
+def test_transformation_pipeline(
+    monkeypatch: pytest.MonkeyPatch, duration: float, exit_status: int, fused: bool
+) -> None:
+    """Ensure the status of transformations is checked with backoff until they finish or the walltime.
+
+    In fused pipelines, the transformation blocks the process but follows the same inputs.
+    """
+    from aiida import orm
+    from aiida.engine import run_get_node
+
+    from execflow.oteapi_strategies import registry
+    from execflow.oteapi_strategies.transformation import POLL_INTERVAL, GetTransformation
+    from execflow.workchains.oteapi_pipeline import OTEPipeline
+
+    create_strategy = registry.create_strategy
+    monkeypatch.setattr(
+        registry,
+        "create_strategy",
+        lambda strategy_type, config: (
+            LocalTransformation(config) if strategy_type == "transformation" else create_strategy(strategy_type, config)
+        ),
+    )
+
+    pipeline = {
+        "version": 1,
+        "strategies": [
+            {"transformation": "local", "transformationType": "local/test", "configuration": {"duration": duration}}
+        ],
+        "pipelines": {"pipe": "local"},
+    }
+    inputs = {
+        "pipeline": orm.Dict(pipeline),
+        "fused": orm.Bool(fused),
+        "transformation": {"walltime": orm.Float(2), "interval": orm.Float(0.1), "max_interval": orm.Float(0.4)},
+    }
+    if fused and exit_status:
+        with pytest.raises(TimeoutError, match="within 2.0 s"):
+            run_get_node(OTEPipeline, **inputs)
+        return
+
+    result, node = run_get_node(OTEPipeline, **inputs)
+    if not fused:
+        (transformation,) = [child for child in node.called if child.process_class is GetTransformation]
+        assert transformation.exit_status == exit_status
+    if exit_status:
+        assert node.exit_status == OTEPipeline.exit_codes.ERROR_SUBPROCESS.status
+    else:
+        assert node.is_finished_ok
+        # Checked after 0.1 s, 0.3 s, 0.7 s, the intervals doubling up to `max_interval`
+        intervals = result["session"]["intervals"]
+        assert len(intervals) >= 2
+        # Not the default interval
+        assert intervals[0] < POLL_INTERVAL
+        for index, interval in enumerate(intervals):
+            assert interval >= min(0.1 * 2**index, 0.4) - 0.01